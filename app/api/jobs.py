@@ -0,0 +1,288 @@
+# app/api/jobs.py
+import multiprocessing as mp
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from app.io.schema import ExtractionResult, PageResult
+from app.pipeline.batch import torch_threads_per_worker
+from app.pipeline.metrics import METRICS
+
+class QueueFull(Exception):
+    """Raised by WorkerPool.submit when the job queue is at capacity."""
+
+@dataclass
+class Job:
+    id: str
+    pdf_path: Path
+    use_cache: bool = True
+    cleanup: bool = False  # delete pdf_path once the job is finished
+    stream: bool = False  # push a PageResult to `pages` as each page finishes
+    status: str = "queued"  # queued | running | done | failed | cancelled | timeout
+    result: Optional[ExtractionResult] = None
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    cancel_requested: bool = False
+    pages: "queue.Queue[Optional[PageResult]]" = field(default_factory=queue.Queue, repr=False)
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+    _listeners: List[Callable[[], None]] = field(default_factory=list, repr=False)
+
+    @property
+    def is_finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def add_listener(self, fn: Callable[[], None]) -> None:
+        """Call `fn()` from the pool's thread after each page and once the job is finished."""
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[], None]) -> None:
+        self._listeners.remove(fn)
+
+    def _push(self, page: Optional[PageResult]) -> None:
+        self.pages.put(page)
+        for fn in list(self._listeners):
+            fn()
+
+    def info(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "queued_s": round((self.started or time.time()) - self.submitted, 3),
+            "run_s": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+        }
+
+def _worker_main(conn, torch_threads: int) -> None:
+    """Worker process: load (and warm up) the models once, then run jobs sent over `conn` until None."""
+    from app.pipeline.pipeline import load_models, iter_pipeline, warm_up
+    import settings
+    load_times = load_models(torch_threads)
+    conn.send(("ready", load_times, warm_up() if settings.API_WARMUP else {}))
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        pdf_path, use_cache, stream = msg
+        try:
+            window = settings.STREAM_WINDOW_PAGES if stream else None
+            for out in iter_pipeline(Path(pdf_path), use_cache=use_cache, window=window):
+                if isinstance(out, PageResult):
+                    if stream:
+                        conn.send(("page", out))
+                else:
+                    conn.send(("done", out))
+        except Exception as e:
+            conn.send(("failed", f"{type(e).__name__}: {e}"))
+
+class _Slot:
+    """One worker process plus the thread in this process that feeds it jobs."""
+
+    def __init__(self, pool: "WorkerPool", idx: int):
+        self.pool = pool
+        self.idx = idx
+        self.proc = None
+        self.conn = None
+        self.ready = False
+        self.thread = threading.Thread(target=self._loop, name=f"job-slot-{idx}", daemon=True)
+
+    def _spawn(self) -> None:
+        ctx = mp.get_context("spawn")  # fork + torch threads don't mix
+        parent, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child, self.pool.torch_threads), daemon=True)
+        self.proc.start()
+        child.close()
+        self.conn = parent
+        while not self.pool._stopping:
+            if self.conn.poll(0.5):
+                _, load_times, warmup_times = self.conn.recv()  # "ready", models are loaded
+                for model, seconds in load_times.items():
+                    METRICS.observe("model_load_seconds", seconds, model=model)
+                for model, seconds in warmup_times.items():
+                    METRICS.observe("model_warmup_seconds", seconds, model=model)
+                self.ready = True
+                return
+            if not self.proc.is_alive():
+                raise RuntimeError(f"worker {self.idx} exited during startup ({self.proc.exitcode})")
+
+    def _kill(self) -> None:
+        self.ready = False
+        if self.proc is not None and self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join(5)
+        if self.conn is not None:
+            self.conn.close()
+        self.proc = self.conn = None
+
+    def _loop(self) -> None:
+        while not self.pool._stopping:
+            if not self.ready:
+                try:
+                    self._spawn()
+                except (RuntimeError, OSError, EOFError) as e:
+                    print(f"[jobs] worker {self.idx} failed to start: {e!r}; retrying")
+                    self._kill()
+                    time.sleep(5)
+                continue
+            try:
+                job = self.pool._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if job.cancel_requested:
+                self.pool._finish(job, "cancelled")
+                continue
+            self._run(job)
+
+    def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.started = time.time()
+        deadline = job.started + self.pool.timeout_s
+        try:
+            self.conn.send((str(job.pdf_path), job.use_cache, job.stream))
+            while True:
+                if self.conn.poll(0.2):
+                    kind, payload = self.conn.recv()
+                    if kind == "done":
+                        self.pool._finish(job, "done", result=payload)
+                        return
+                    if kind == "failed":
+                        self.pool._finish(job, "failed", error=payload)
+                        return
+                    job._push(payload)  # "page"
+                # a running job can only be stopped by killing its worker; a fresh one is spawned
+                if job.cancel_requested:
+                    self._kill()
+                    self.pool._finish(job, "cancelled")
+                    return
+                if time.time() > deadline:
+                    self._kill()
+                    self.pool._finish(job, "timeout", error=f"exceeded {self.pool.timeout_s:.0f}s")
+                    return
+                if not self.proc.is_alive():
+                    raise EOFError(f"worker exited ({self.proc.exitcode})")
+        except (EOFError, OSError) as e:
+            self._kill()
+            self.pool._finish(job, "failed", error=f"worker crashed: {e}")
+
+class WorkerPool:
+    """
+    Runs run_pipeline in `n_workers` processes that each load the models once.
+    Jobs wait in a bounded queue (submit raises QueueFull when it is full); running jobs
+    are killed on timeout or cancel, and finished jobs are kept `ttl_s` for polling.
+    """
+
+    def __init__(self, n_workers: int, max_queue: int, timeout_s: float, ttl_s: float,
+                 torch_threads: int = 0):
+        self.n_workers = max(1, n_workers)
+        self.timeout_s = timeout_s
+        self.ttl_s = ttl_s
+        self.torch_threads = torch_threads_per_worker(self.n_workers, torch_threads)
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max(1, max_queue))
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._slots = [_Slot(self, i) for i in range(self.n_workers)]
+
+    @property
+    def ready(self) -> bool:
+        return any(s.ready for s in self._slots)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = sum(j.status == "running" for j in self._jobs.values())
+        return {
+            "workers": self.n_workers,
+            "workers_ready": sum(s.ready for s in self._slots),
+            "jobs_queued": self._queue.qsize(),
+            "jobs_running": running,
+        }
+
+    def start(self) -> None:
+        for s in self._slots:
+            s.thread.start()
+
+    def stop(self) -> None:
+        self._stopping = True
+        for s in self._slots:
+            try:
+                if s.conn is not None:
+                    s.conn.send(None)
+            except OSError:
+                pass
+        for s in self._slots:
+            s.thread.join(2)
+            s._kill()
+        # uploads of jobs that will never run
+        with self._lock:
+            for job in self._jobs.values():
+                if job.cleanup and not job.is_finished:
+                    job.pdf_path.unlink(missing_ok=True)
+
+    def submit(self, pdf_path: Path, use_cache: bool = True, cleanup: bool = False,
+               stream: bool = False) -> Job:
+        return self.submit_many([pdf_path], use_cache=use_cache, cleanup=cleanup, stream=stream)[0]
+
+    def submit_many(self, pdf_paths: List[Path], use_cache: bool = True, cleanup: bool = False,
+                    stream: bool = False) -> List[Job]:
+        """Queue one job per PDF, all or none: raises QueueFull if they don't all fit."""
+        self._prune()
+        jobs = [Job(id=uuid.uuid4().hex, pdf_path=Path(p), use_cache=use_cache,
+                    cleanup=cleanup, stream=stream) for p in pdf_paths]
+        # slots only free up concurrently, so checking under the lock is enough
+        with self._lock:
+            if self._queue.maxsize - self._queue.qsize() < len(jobs):
+                raise QueueFull(f"{self._queue.qsize()} of {self._queue.maxsize} job slots taken")
+            for job in jobs:
+                self._queue.put_nowait(job)
+                self._jobs[job.id] = job
+        return jobs
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job: a queued one is taken off the queue (freeing its slot) right away,
+        a running one is killed by its slot.
+        """
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return job
+        job.cancel_requested = True
+        with self._queue.mutex:
+            try:
+                self._queue.queue.remove(job)
+            except ValueError:
+                return job  # a slot has taken it already
+            self._queue.not_full.notify()
+        self._finish(job, "cancelled")
+        return job
+
+    def _finish(self, job: Job, status: str, result: Optional[ExtractionResult] = None,
+                error: Optional[str] = None) -> None:
+        job.status, job.result, job.error = status, result, error
+        job.finished = time.time()
+        METRICS.inc("jobs_total", status=status)
+        if job.started:
+            METRICS.observe("job_queue_seconds", job.started - job.submitted)
+            METRICS.observe("job_run_seconds", job.finished - job.started)
+        if result is not None:
+            METRICS.record_result(result.diagnostics)
+        if job.cleanup:
+            job.pdf_path.unlink(missing_ok=True)
+        job._done.set()
+        job._push(None)  # end of stream
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        with self._lock:
+            for jid in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+                del self._jobs[jid]
@@ -1,16 +1,294 @@
 # app/api/server.py
-from fastapi import FastAPI, UploadFile
-from app.pipeline.pipeline import run_pipeline
+import asyncio
+import json
+import os
+import queue
 import tempfile
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, List, Tuple
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from python_multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
+from app.api.jobs import Job, QueueFull, WorkerPool
+from app.pipeline.metrics import METRICS
+import settings
 
-app = FastAPI()
+pool = WorkerPool(
+    n_workers=settings.API_WORKERS,
+    max_queue=settings.API_MAX_QUEUE,
+    timeout_s=settings.API_JOB_TIMEOUT_S,
+    ttl_s=settings.API_JOB_TTL_S,
+    torch_threads=settings.WORKER_TORCH_THREADS,
+)
 
-@app.post("/extract")
-async def extract(file: UploadFile):
-    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-        tmp.write(await file.read())
-        tmp.flush()
-        result = run_pipeline(Path(tmp.name))
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool.start()
+    yield
+    pool.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+# multipart boundary and part headers around each file, on top of its own size
+UPLOAD_PART_OVERHEAD = 16 * 1024
+
+class _Uploads:
+    """
+    Multipart callbacks that write each file part straight from the request body to its
+    own temp file: an upload is stored once, and refused while it arrives once it passes
+    settings.API_MAX_UPLOAD_MB. Form fields are skipped.
+    """
+
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        self.limit = settings.API_MAX_UPLOAD_MB * 1024 * 1024
+        self.files: List[Tuple[str, Path]] = []  # (filename, temp file)
+        self.out = None  # the file part being written
+        self._size = 0
+        self._field = self._value = self._disposition = b""
+
+    def callbacks(self) -> dict:
+        return {"on_part_begin": self.on_part_begin, "on_header_field": self.on_header_field,
+                "on_header_value": self.on_header_value, "on_header_end": self.on_header_end,
+                "on_headers_finished": self.on_headers_finished, "on_part_data": self.on_part_data,
+                "on_part_end": self.on_part_end}
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._field.lower() == b"content-disposition":
+            self._disposition = self._value
+        self._field = self._value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        if b"filename" not in options:
+            return
+        if len(self.files) == self.max_files:
+            raise HTTPException(status_code=413, detail=f"At most {self.max_files} file(s) per request")
+        fd, name = tempfile.mkstemp(suffix=".pdf")
+        self.files.append((options[b"filename"].decode("utf-8", "replace"), Path(name)))
+        self.out = os.fdopen(fd, "wb")
+        self._size = 0
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.out is None:
+            return
+        self._size += end - start
+        if self._size > self.limit:
+            raise HTTPException(status_code=413, detail=f"{self.files[-1][0]}: larger than "
+                                                        f"{settings.API_MAX_UPLOAD_MB:g} MB")
+        self.out.write(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+    def discard(self) -> None:
+        self.on_part_end()
+        for _, path in self.files:
+            path.unlink(missing_ok=True)
+
+async def _receive_uploads(request: Request, max_files: int = 1) -> List[Tuple[str, Path]]:
+    """
+    The files of a multipart/form-data request as (filename, temp file), read from the raw
+    body stream (see _Uploads). Rejects with 413 before reading anything when Content-Length
+    is already over the limits. The caller deletes the files.
+    """
+    uploads = _Uploads(max_files)
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_files * (uploads.limit + UPLOAD_PART_OVERHEAD):
+        raise HTTPException(status_code=413, detail=f"Request larger than {max_files} x "
+                                                    f"{settings.API_MAX_UPLOAD_MB:g} MB")
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data upload")
+    parser = MultipartParser(params[b"boundary"], uploads.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+        if uploads.out is not None:
+            raise HTTPException(status_code=400, detail="Upload ended in the middle of a file")
+    except BaseException as e:
+        uploads.discard()
+        if isinstance(e, MultipartParseError):
+            raise HTTPException(status_code=400, detail=f"Malformed upload: {e}")
+        raise
+    if not uploads.files:
+        raise HTTPException(status_code=422, detail="No file uploaded")
+    return uploads.files
+
+def _upload_body(field: str, many: bool = False) -> dict:
+    """OpenAPI request body of the endpoints that read their uploads with _receive_uploads."""
+    schema = {"type": "string", "format": "binary"}
+    if many:
+        schema = {"type": "array", "items": schema}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "properties": {field: schema}, "required": [field]}}}}}
+
+def _submit(uploads: List[Tuple[str, Path]], use_cache: bool, stream: bool = False) -> List[Job]:
+    """Queue one job per received upload; the jobs delete their file when finished."""
+    paths = [path for _, path in uploads]
+    try:
+        return pool.submit_many(paths, use_cache=use_cache, cleanup=True, stream=stream)
+    except QueueFull as e:
+        for path in paths:
+            path.unlink(missing_ok=True)
+        raise HTTPException(status_code=429, detail=f"Server busy: {e}")
+
+@asynccontextmanager
+async def _updates(job: Job) -> AsyncIterator[asyncio.Event]:
+    """
+    An asyncio.Event that the pool's thread sets (via call_soon_threadsafe) after each page
+    of `job` and when it finishes, so requests wait on the event loop instead of in a thread.
+    """
+    loop = asyncio.get_running_loop()
+    event = asyncio.Event()
+
+    def wake():
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:  # loop closed at shutdown
+            pass
+
+    job.add_listener(wake)
+    try:
+        yield event
+    finally:
+        job.remove_listener(wake)
+
+async def _wait(job: Job) -> None:
+    async with _updates(job) as update:
+        while not job.is_finished:
+            await update.wait()
+            update.clear()
+
+def _result_body(job: Job) -> dict:
+    result = job.result
     return {"items": [i.model_dump() for i in result.items],
-            "warnings": result.warnings}
+            "warnings": result.warnings,
+            "diagnostics": result.diagnostics}
+
+def _raise_for(job: Job):
+    if job.status == "timeout":
+        raise HTTPException(status_code=504, detail=job.error)
+    if job.status == "cancelled":
+        raise HTTPException(status_code=409, detail="Job was cancelled")
+    raise HTTPException(status_code=500, detail=job.error)
+
+@app.post("/extract", openapi_extra=_upload_body("file"))
+async def extract(request: Request, use_cache: bool = True):
+    (job,) = _submit(await _receive_uploads(request), use_cache)
+    await _wait(job)
+    if job.status != "done":
+        _raise_for(job)
+    return _result_body(job)
+
+@app.post("/extract/batch", openapi_extra=_upload_body("files", many=True))
+async def extract_batch(request: Request, use_cache: bool = True):
+    """
+    Several PDFs in one request. They are queued together (all or none, 429 if they
+    don't fit) and spread over the pool's workers, which keep their models loaded.
+    Returns one entry per file, in upload order; a failed file doesn't fail the request.
+    """
+    uploads = await _receive_uploads(request, max_files=settings.API_MAX_FILES)
+    jobs = _submit(uploads, use_cache)
+    documents = []
+    for (filename, _), job in zip(uploads, jobs):
+        await _wait(job)
+        doc = {"filename": filename, "status": job.status}
+        if job.status == "done":
+            doc.update(_result_body(job))
+        else:
+            doc["error"] = job.error or ("Job was cancelled" if job.status == "cancelled" else None)
+        documents.append(doc)
+    return {"documents": documents}
+
+def _ndjson(obj: dict) -> str:
+    return json.dumps(jsonable_encoder(obj)) + "\n"
+
+@app.post("/extract/stream", openapi_extra=_upload_body("file"))
+async def extract_stream(request: Request, use_cache: bool = True):
+    """
+    NDJSON stream: one {"type": "page", ...} line per page as soon as it is parsed,
+    then a {"type": "summary", ...} line with the reconcile warnings (or {"type": "error"}).
+    """
+    (job,) = _submit(await _receive_uploads(request), use_cache, stream=True)
+
+    async def lines():
+        try:
+            async with _updates(job) as update:
+                while True:
+                    update.clear()
+                    try:
+                        page = job.pages.get_nowait()
+                    except queue.Empty:
+                        await update.wait()
+                        continue
+                    if page is None:
+                        break
+                    yield _ndjson({"type": "page", **page.model_dump()})
+            if job.status == "done":
+                yield _ndjson({"type": "summary", "warnings": job.result.warnings,
+                               "diagnostics": job.result.diagnostics})
+            else:
+                yield _ndjson({"type": "error", "status": job.status, "error": job.error})
+        finally:
+            # client went away mid-stream: don't keep a worker busy for nobody
+            if not job.is_finished:
+                pool.cancel(job.id)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/jobs", status_code=202, openapi_extra=_upload_body("file"))
+async def submit_job(request: Request, use_cache: bool = True):
+    (job,) = _submit(await _receive_uploads(request), use_cache)
+    return job.info()
+
+def _get_job(job_id: str) -> Job:
+    job = pool.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _get_job(job_id).info()
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = _get_job(job_id)
+    if not job.is_finished:
+        return JSONResponse(status_code=202, content=job.info())
+    if job.status != "done":
+        _raise_for(job)
+    return _result_body(job)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    pool.cancel(job_id)
+    return _get_job(job_id).info()
+
+@app.get("/health")
+async def health():
+    """Readiness: 200 once a worker has loaded and warmed up its models, 503 before."""
+    stats = pool.stats()
+    ready = stats["workers_ready"] > 0
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={"status": "ready" if ready else "starting", **stats})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: documents, pages, cache hits, per-stage and model-load times."""
+    return METRICS.render(gauges=pool.stats())
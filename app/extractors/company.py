@@ -0,0 +1,28 @@
+# app/extractors/company.py
+import re
+from collections import Counter
+from typing import Iterable, Optional
+
+# Belgian enterprise number (ondernemingsnummer / KBO, also the VAT number without "BE"):
+# 10 digits starting with 0 or 1, usually written 0123.456.789 or BE 0123 456 789
+RE_COMPANY_NUMBER = re.compile(r"(?<![\d.])(?:BE\s?)?([01])\s?(\d{3})[.\s]?(\d{3})[.\s]?(\d{3})(?![\d.,])")
+
+def _valid(number: str) -> bool:
+    """Mod-97 check digits, which rules out amounts and account numbers of that shape."""
+    return 97 - int(number[:8]) % 97 == int(number[8:])
+
+def company_number(texts: Iterable[str]) -> Optional[str]:
+    """
+    The enterprise number that occurs most often in `texts` (the first pages of a report:
+    letterhead, page headers), formatted 0123.456.789; None if there is none.
+    """
+    found = Counter()
+    for text in texts:
+        for m in RE_COMPANY_NUMBER.finditer(text):
+            number = "".join(m.groups())
+            if _valid(number):
+                found[number] += 1
+    if not found:
+        return None
+    n = found.most_common(1)[0][0]
+    return f"{n[:4]}.{n[4:7]}.{n[7:]}"
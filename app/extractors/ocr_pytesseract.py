@@ -1,11 +1,58 @@
 # app/extractors/ocr_pytesseract.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-import pdfplumber
-import pytesseract
-import pandas as pd
+from typing import List, Tuple
+import numpy as np
+from app.ir.schema import TokenArray
+import settings
+
+@lru_cache(maxsize=None)
+def version() -> str:
+    """Tesseract version, "" if pytesseract or the tesseract binary is missing."""
+    try:
+        import pytesseract
+        return str(pytesseract.get_tesseract_version())
+    except Exception as e:
+        print(f"[ocr] tesseract not available, using docTR only: {e}")
+        return ""
+
+def tesseract_tokens(img: np.ndarray, page_idx: int) -> Tuple[TokenArray, np.ndarray]:
+    """
+    Word tokens of a rendered page (pixel coords of `img`) and their Tesseract
+    confidences (0-100), in Tesseract's reading order.
+    """
+    import pytesseract
+    data = pytesseract.image_to_data(img, lang=settings.OCR_TESSERACT_LANG,
+                                     output_type=pytesseract.Output.DICT)
+    # conf is -1 for block / line entries, which have no text
+    keep = [i for i, (text, conf) in enumerate(zip(data["text"], data["conf"]))
+            if str(text).strip() and float(conf) >= 0]
+    if not keep:
+        return TokenArray.empty(), np.empty(0)
+    x0 = np.array([data["left"][i] for i in keep], dtype=np.float64)
+    y0 = np.array([data["top"][i] for i in keep], dtype=np.float64)
+    w = np.array([data["width"][i] for i in keep], dtype=np.float64)
+    h = np.array([data["height"][i] for i in keep], dtype=np.float64)
+    tokens = TokenArray([str(data["text"][i]).strip() for i in keep],
+                        np.column_stack([x0, y0, x0 + w, y0 + h]), np.full(len(keep), page_idx))
+    return tokens, np.array([float(data["conf"][i]) for i in keep])
+
+def tesseract_pages(imgs: List[np.ndarray], pages: List[int]) -> List[Tuple[TokenArray, np.ndarray]]:
+    """
+    tesseract_tokens for several pages in parallel. Each call runs the tesseract binary
+    in its own process, so threads give real parallelism.
+    """
+    threads = settings.OCR_TESSERACT_THREADS or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(imgs)))) as ex:
+        return list(ex.map(tesseract_tokens, imgs, pages))
 
 def extract_ocr_blocks(pdf_path: Path):
     """Last-resort OCR extraction."""
+    import pdfplumber
+    import pytesseract
+    import pandas as pd
     dfs = []
     try:
         with pdfplumber.open(pdf_path) as pdf:
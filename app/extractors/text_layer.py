@@ -0,0 +1,28 @@
+# app/extractors/text_layer.py
+import fitz  # PyMuPDF
+import numpy as np
+from app.ir.schema import TokenArray
+
+def text_layer_tokens(page: fitz.Page, page_idx: int, dpi: int) -> TokenArray:
+    """
+    Tokens from the embedded PDF text layer, in pixel coords of the page rendered at `dpi`.
+    """
+    words = [w for w in page.get_text("words", sort=True) if w[4].strip()]
+    if not words:
+        return TokenArray.empty()
+    # word boxes are in unrotated PDF points; map them the same way get_pixmap does
+    m = page.rotation_matrix * fitz.Matrix(dpi / 72.0, dpi / 72.0)
+    pts = np.array([w[:4] for w in words], dtype=np.float64)
+    # transform both corners; page rotations are multiples of 90°, so they stay opposite corners
+    xs = m.a * pts[:, [0, 2]] + m.c * pts[:, [1, 3]] + m.e
+    ys = m.b * pts[:, [0, 2]] + m.d * pts[:, [1, 3]] + m.f
+    boxes = np.column_stack([xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1)])
+    boxes = boxes.astype(np.float32).astype(np.float64)  # MuPDF geometry is single precision
+    return TokenArray([w[4].strip() for w in words], boxes, np.full(len(words), page_idx))
+
+def has_text_layer(tokens: TokenArray, min_words: int) -> bool:
+    """True if the text layer looks usable (enough words, not mostly unmapped glyphs)."""
+    if len(tokens) < min_words:
+        return False
+    garbled = sum("�" in t for t in tokens.text)
+    return garbled <= len(tokens) * 0.1
@@ -1,10 +1,96 @@
 # app/io/export.py
+import uuid
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pathlib import Path
+from typing import Optional, Sequence
 from .schema import LineItem
 
+# Exact amounts: Decimal with 6 places (parsed amounts have at most 2); wider values raise
+# instead of being rounded.
+AMOUNT_TYPE = pa.decimal128(38, 6)
+
+LONG_SCHEMA = pa.schema([
+    ("document", pa.string()),
+    ("company", pa.string()),
+    ("rekeningnummer", pa.string()),
+    ("postnaam", pa.string()),
+    ("amount", AMOUNT_TYPE),
+    ("fiscal_year", pa.int32()),
+    ("currency", pa.string()),
+    ("source_page", pa.int32()),
+    ("confidence", pa.float64()),
+])
+
+WIDE_KEYS = ["document", "company", "rekeningnummer", "postnaam"]
+
 def to_csv_wide(items: list[LineItem], out_path: Path):
     df = pd.DataFrame([i.model_dump() for i in items])
-    wide = df.pivot_table(index=["rekeningnummer", "postnaam"], 
+    wide = df.pivot_table(index=["rekeningnummer", "postnaam"],
                           columns="fiscal_year", values="amount", fill_value=0)
     wide.to_csv(out_path, sep=";")
+
+def to_arrow_long(items: Sequence[LineItem], document: str = "",
+                  company: Optional[str] = None) -> pa.Table:
+    """
+    One row per line item (LONG_SCHEMA), built column by column from the attributes.
+    `company` defaults to `document` (the PDF name) when the caller doesn't know it.
+    """
+    n = len(items)
+    return pa.Table.from_arrays([
+        pa.array([document] * n, pa.string()),
+        pa.array([company or document] * n, pa.string()),
+        pa.array([i.rekeningnummer for i in items], pa.string()),
+        pa.array([i.postnaam for i in items], pa.string()),
+        pa.array([i.amount for i in items], AMOUNT_TYPE),
+        pa.array([i.fiscal_year for i in items], pa.int32()),
+        pa.array([i.currency for i in items], pa.string()),
+        pa.array([i.source_page for i in items], pa.int32()),
+        pa.array([i.confidence for i in items], pa.float64()),
+    ], schema=LONG_SCHEMA)
+
+def to_arrow_wide(long: pa.Table) -> pa.Table:
+    """
+    Accounts x fiscal years, like to_csv_wide: one Decimal column per year (named by the
+    year), duplicates averaged, null where an account has no amount for that year.
+    """
+    agg = long.group_by(WIDE_KEYS + ["fiscal_year"]).aggregate([("amount", "mean")])
+    df = agg.to_pandas()
+    wide = df.pivot(index=WIDE_KEYS, columns="fiscal_year", values="amount_mean")
+    wide = wide.reindex(sorted(wide.columns), axis=1).sort_index().reset_index()
+    wide.columns = [str(c) for c in wide.columns]
+    years = [c for c in wide.columns if c not in WIDE_KEYS]
+    schema = pa.schema([(k, pa.string()) for k in WIDE_KEYS] + [(y, AMOUNT_TYPE) for y in years])
+    return pa.Table.from_pandas(wide.astype(object).where(wide.notna(), None),
+                                schema=schema, preserve_index=False)
+
+def to_parquet(items: Sequence[LineItem], out_path: Path, layout: str = "wide",
+               document: str = "", company: Optional[str] = None) -> None:
+    """Write one document's items as a Parquet file, `layout` "long" or "wide"."""
+    table = to_arrow_long(items, document, company)
+    if layout == "wide":
+        table = to_arrow_wide(table)
+    elif layout != "long":
+        raise ValueError(f"Unknown layout {layout!r} (expected 'long' or 'wide')")
+    pq.write_table(table, out_path)
+
+def append_dataset(items: Sequence[LineItem], base_dir: Path, document: str = "",
+                   company: Optional[str] = None,
+                   partition_by: Sequence[str] = ("fiscal_year",)) -> None:
+    """
+    Add one document's items (long layout) to a hive-partitioned Parquet dataset under
+    `base_dir`, e.g. partition_by=("company",) → base_dir/company=<name>/<uuid>-0.parquet.
+    Every call writes new files, so documents (and parallel writers) append side by side;
+    read it back with pyarrow.dataset.dataset(base_dir, partitioning="hive").
+    """
+    table = to_arrow_long(items, document, company)
+    if not table.num_rows:
+        return
+    ds.write_dataset(
+        table, base_dir, format="parquet",
+        partitioning=list(partition_by) or None, partitioning_flavor="hive" if partition_by else None,
+        basename_template=f"{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
@@ -0,0 +1,37 @@
+# app/io/golden.py
+"""
+Golden outputs: the reviewed line items of a document in the wide layout written by
+cli.py (tests/golden/<name>.csv). A golden may cover only part of a document; its pages
+are then listed next to it in <name>.json as {"pages": [first, last]} (source_page
+numbers, inclusive) and only items of those pages are scored against it.
+"""
+import json
+from pathlib import Path
+from typing import Optional
+import pandas as pd
+
+def read_wide(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path, sep=";", dtype={"rekeningnummer": str})
+
+def golden_pages(golden: Path) -> Optional[range]:
+    """The pages `golden` covers, None for the whole document."""
+    spec = golden.with_suffix(".json")
+    if not spec.exists():
+        return None
+    first, last = json.loads(spec.read_text())["pages"]
+    return range(first, last + 1)
+
+def facts(wide: pd.DataFrame) -> set:
+    """(rekeningnummer, fiscal_year, amount) triples of a wide table; zeros are pivot fill."""
+    long = wide.melt(id_vars=["rekeningnummer", "postnaam"], var_name="fiscal_year", value_name="amount")
+    long = long[long["amount"].astype(float) != 0]
+    return {(str(r.rekeningnummer), int(float(r.fiscal_year)), round(float(r.amount), 2))
+            for r in long.itertuples()}
+
+def score(pred: set, gold: set) -> dict:
+    tp = len(pred & gold)
+    return {
+        "tp": tp, "fp": len(pred - gold), "fn": len(gold - pred),
+        "precision": round(tp / len(pred), 4) if pred else None,
+        "recall": round(tp / len(gold), 4) if gold else None,
+    }
@@ -16,3 +16,10 @@ class ExtractionResult(BaseModel):
     items: list[LineItem]
     warnings: list[str]
     diagnostics: dict
+
+class PageResult(BaseModel):
+    """Line items of one page, emitted as soon as that page is done (streaming)."""
+    page: int
+    items: list[LineItem]
+    warnings: list[str]
+    diagnostics: dict
@@ -1,6 +1,8 @@
 # app/ir/schema.py
-from pydantic import BaseModel
-from typing import List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict
+from pydantic_core import core_schema
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
 
 BBox = Tuple[float, float, float, float]  # x0,y0,x1,y1 in page pixels
 
@@ -9,6 +11,86 @@ class Token(BaseModel):
     x0: float; y0: float; x1: float; y1: float
     page: int
 
+class TokenArray(Sequence[Token]):
+    """
+    Columnar token store: one (n,4) float64 array of boxes, one int32 array of pages and
+    a list of strings, instead of n validated Token models. Parsers use the arrays
+    directly; indexing / iterating yields Token objects for existing callers, and it
+    serializes as a list of Token dicts.
+    """
+    __slots__ = ("text", "boxes", "page")
+
+    def __init__(self, text: List[str], boxes: np.ndarray, page: np.ndarray):
+        self.text = text
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.page = np.asarray(page, dtype=np.int32)
+
+    @classmethod
+    def empty(cls) -> "TokenArray":
+        return cls([], np.empty((0, 4)), np.empty(0))
+
+    @classmethod
+    def from_tokens(cls, tokens) -> "TokenArray":
+        toks = [t if isinstance(t, Token) else Token.model_validate(t) for t in tokens]
+        return cls([t.text for t in toks],
+                   np.array([(t.x0, t.y0, t.x1, t.y1) for t in toks], dtype=np.float64),
+                   np.array([t.page for t in toks], dtype=np.int32))
+
+    @classmethod
+    def concat(cls, arrays: List["TokenArray"]) -> "TokenArray":
+        if not arrays:
+            return cls.empty()
+        return cls([t for a in arrays for t in a.text],
+                   np.concatenate([a.boxes for a in arrays]),
+                   np.concatenate([a.page for a in arrays]))
+
+    @property
+    def x0(self) -> np.ndarray: return self.boxes[:, 0]
+    @property
+    def y0(self) -> np.ndarray: return self.boxes[:, 1]
+    @property
+    def x1(self) -> np.ndarray: return self.boxes[:, 2]
+    @property
+    def y1(self) -> np.ndarray: return self.boxes[:, 3]
+
+    def centers(self) -> Tuple[np.ndarray, np.ndarray]:
+        return (self.boxes[:, 0] + self.boxes[:, 2]) / 2.0, (self.boxes[:, 1] + self.boxes[:, 3]) / 2.0
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return TokenArray(self.text[i], self.boxes[i], self.page[i])
+        x0, y0, x1, y1 = self.boxes[i].tolist()
+        return Token(text=self.text[i], x0=x0, y0=y0, x1=x1, y1=y1, page=int(self.page[i]))
+
+    def __iter__(self) -> Iterator[Token]:
+        for i in range(len(self.text)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TokenArray):
+            return NotImplemented
+        return self.text == other.text and np.array_equal(self.boxes, other.boxes) \
+            and np.array_equal(self.page, other.page)
+
+    def to_list(self) -> List[dict]:
+        return [{"text": t, "x0": b[0], "y0": b[1], "x1": b[2], "y1": b[3], "page": p}
+                for t, b, p in zip(self.text, self.boxes.tolist(), self.page.tolist())]
+
+    @classmethod
+    def _validate(cls, v: Any) -> "TokenArray":
+        return v if isinstance(v, TokenArray) else cls.from_tokens(v)
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler):
+        return core_schema.no_info_plain_validator_function(
+            cls._validate,
+            json_schema_input_schema=handler.generate_schema(List[Token]),
+            serialization=core_schema.plain_serializer_function_ser_schema(lambda v: v.to_list()),
+        )
+
 class TableCell(BaseModel):
     row: int
     col: int
@@ -22,13 +104,24 @@ class TableBlock(BaseModel):
     cells: List[TableCell]
     n_rows: int
     n_cols: int
+    # column roles found by the parser: acc_col, name_col, amount_cols, year_headers
+    roles: Optional[Dict[str, Any]] = None
 
 class PageIR(BaseModel):
+    # lists of Token (or dicts) assigned to .tokens are converted to a TokenArray
+    model_config = ConfigDict(validate_assignment=True)
+
     page: int
     width: int
     height: int
-    tokens: List[Token]
+    tokens: TokenArray
     tables: List[TableBlock]
+    token_source: str = "doctr"  # "doctr" | "tesseract" | "tesseract+doctr" | "text_layer" | "skipped" (triage)
+    table_source: str = "model"  # "model" | "layout" (reused grid, see app.pipeline.layouts)
 
 class DocIR(BaseModel):
     pages: List[PageIR]
+
+    def token_array(self) -> TokenArray:
+        """All tokens of the document in one columnar store."""
+        return TokenArray.concat([p.tokens for p in self.pages])
@@ -0,0 +1,102 @@
+# app/ml/backend.py
+import hashlib
+import json
+import os
+import tempfile
+from importlib import metadata
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional, Sequence
+import settings
+
+if TYPE_CHECKING:
+    import torch
+
+BACKENDS = ("fp32", "int8")
+
+_torch_threads = 0  # intra-op threads per model set by limit_torch_threads, 0 = not yet
+
+def package_version(pkg: str) -> str:
+    try:
+        return metadata.version(pkg)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+def hf_revision(repo_id: str) -> str:
+    """Commit of the locally cached Hugging Face snapshot of `repo_id`, "main" if not downloaded yet."""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        path = try_to_load_from_cache(repo_id, "config.json")
+    except Exception:
+        return "main"
+    # <cache>/models--org--name/snapshots/<commit>/config.json
+    return Path(path).parent.name if isinstance(path, str) else "main"
+
+def limit_torch_threads(total: Optional[int] = None) -> int:
+    """
+    Cap torch's intra-op threads so this process runs inference on about `total` cores
+    (0 = all; None = keep an earlier cap, else settings.WORKER_TORCH_THREADS). The
+    pipeline's OCR and table stages run their models at the same time, each in its
+    PIPELINE_*_THREADS threads, so each of those gets an equal share. Returns the share.
+    """
+    global _torch_threads
+    if total is None:
+        if _torch_threads:
+            return _torch_threads
+        total = settings.WORKER_TORCH_THREADS
+    concurrent = 1
+    if settings.PIPELINE_OVERLAP:
+        concurrent = max(1, settings.PIPELINE_OCR_THREADS) + max(1, settings.PIPELINE_TABLE_THREADS)
+    per_model = max(1, (total or os.cpu_count() or 1) // concurrent)
+    if per_model != _torch_threads:
+        import torch
+        torch.set_num_threads(per_model)
+        _torch_threads = per_model
+    return per_model
+
+def _export_path(name: str, backend: str, source: Sequence[str]) -> Path:
+    import torch
+    d = Path(settings.CACHE_DIR) / "models"
+    d.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha1(json.dumps([torch.__version__, *source]).encode()).hexdigest()[:12]
+    return d / f"{name}-{backend}-{key}.pt"
+
+def load_model(name: str, build: Callable[[], "torch.nn.Module"],
+               source: Sequence[str] = ()) -> "torch.nn.Module":
+    """
+    Model for settings.INFERENCE_BACKEND. `build` returns the pretrained fp32 model.
+    int8: dynamic quantization of Linear/LSTM layers (weights int8, activations quantized
+    on the fly), which is where the transformer / recognition heads spend their CPU time.
+    The quantized model is exported under CACHE_DIR/models and reused on the next start.
+    `source` names what `build` loads (model id / revision, library version): with torch's
+    version it keys the export, so upgraded weights or libraries re-quantize.
+    """
+    import torch  # only once a model is actually needed
+    backend = settings.INFERENCE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r}, expected one of {BACKENDS}")
+    if backend == "fp32":
+        model = build()
+        model.eval()
+        return model
+
+    path = _export_path(name, backend, source)
+    if path.exists():
+        try:
+            model = torch.load(path, weights_only=False)
+            model.eval()
+            return model
+        except Exception as e:
+            print(f"[backend] re-exporting {path.name}: {e}")
+    model = build()
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8)
+    # workers starting together may all export: each writes its own temp file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save(model, f)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return model
@@ -0,0 +1,72 @@
+# app/ml/backend_check.py
+"""
+Accuracy / speed check of an inference backend against fp32 before switching.
+
+    python -m app.ml.backend_check Data/*.pdf [--backend int8] [--out backend_check.csv]
+"""
+import argparse
+import pathlib
+import time
+from typing import Dict, List, Tuple
+import pandas as pd
+from app.io.schema import LineItem
+from app.ml.backend import BACKENDS
+from app.pipeline.batch import expand_inputs
+import settings
+
+def _by_key(items: List[LineItem]) -> Dict[Tuple, List]:
+    out: Dict[Tuple, List] = {}
+    for i in items:
+        out.setdefault((i.source_page, i.rekeningnummer, i.fiscal_year), []).append(i.amount)
+    return out
+
+def compare_items(ref: List[LineItem], new: List[LineItem]) -> dict:
+    """Line-item differences of `new` vs the reference, matched on (page, account, year)."""
+    r, n = _by_key(ref), _by_key(new)
+    return {
+        "ref_items": len(ref),
+        "new_items": len(new),
+        "missing": sum(len(v) for k, v in r.items() if k not in n),
+        "extra": sum(len(v) for k, v in n.items() if k not in r),
+        "amount_changed": sum(1 for k, v in r.items() if k in n and sorted(v) != sorted(n[k])),
+    }
+
+def _run(pdfs: List[pathlib.Path], backend: str) -> Dict[pathlib.Path, Tuple[List[LineItem], float]]:
+    from app.pipeline.pipeline import load_models, run_pipeline
+    settings.INFERENCE_BACKEND = backend
+    load_models()  # keep model load / export out of the timings
+    out = {}
+    for pdf in pdfs:
+        t0 = time.perf_counter()
+        result = run_pipeline(pdf, use_cache=False)
+        out[pdf] = (result.items, time.perf_counter() - t0)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or globs")
+    parser.add_argument("--backend", default="int8", choices=[b for b in BACKENDS if b != "fp32"],
+                        help="backend to compare against fp32")
+    parser.add_argument("--out", type=pathlib.Path, default=None, help="write the per-file table as CSV")
+    args = parser.parse_args()
+
+    pdfs = expand_inputs(args.inputs)
+    ref = _run(pdfs, "fp32")
+    new = _run(pdfs, args.backend)
+    rows = []
+    for pdf in pdfs:
+        row = {"file": pdf.name, **compare_items(ref[pdf][0], new[pdf][0])}
+        row["fp32_s"] = round(ref[pdf][1], 2)
+        row[f"{args.backend}_s"] = round(new[pdf][1], 2)
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False))
+    total = df[["ref_items", "missing", "extra", "amount_changed", "fp32_s", f"{args.backend}_s"]].sum()
+    print(f"\n{args.backend} vs fp32: {total['missing']} missing, {total['extra']} extra, "
+          f"{total['amount_changed']} changed of {total['ref_items']} items; "
+          f"speedup x{total['fp32_s'] / max(total[f'{args.backend}_s'], 1e-9):.2f}")
+    if args.out:
+        df.to_csv(args.out, sep=";", index=False)
+
+if __name__ == "__main__":
+    main()
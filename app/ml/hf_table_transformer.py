@@ -1,11 +1,11 @@
 # app/ml/hf_table_transformer.py
 from pathlib import Path
-from typing import List, Tuple
-import fitz  # PyMuPDF
-import torch
-from PIL import Image
-from transformers import DetrFeatureExtractor, TableTransformerForObjectDetection
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
 from app.ir.schema import DocIR, PageIR, TableBlock, TableCell
+from app.pipeline.render import render_pages
+from app.ml.backend import hf_revision, load_model, package_version
+import settings
 
 # Labels for structure-recognition model
 LABELS = [
@@ -13,35 +13,83 @@ LABELS = [
     "table projected row header", "table spanning cell"
 ]
 
+MODEL_NAME = "microsoft/table-transformer-structure-recognition"
+# Table localisation for TABLE_STRUCTURE_MODE="crop" (labels "table", "table rotated")
+DETECTION_MODEL_NAME = "microsoft/table-transformer-detection"
+MODES = ("page", "crop")
+# margin kept around a located table, px at RENDER_DPI
+CROP_PAD_PX = 40
+
 _feature_extractor = None
 _model = None
+_det_model = None
+_model_backend = None
+
+def _source(model_name: str) -> List[str]:
+    return [model_name, hf_revision(model_name), package_version("transformers")]
 
 def _load_model():
-    global _feature_extractor, _model
-    if _model is None:
+    # torch / transformers are imported here, not at module import, to keep startup fast
+    from transformers import DetrFeatureExtractor, TableTransformerForObjectDetection
+    global _feature_extractor, _model, _det_model, _model_backend
+    if settings.TABLE_STRUCTURE_MODE not in MODES:
+        raise ValueError(f"Unknown TABLE_STRUCTURE_MODE {settings.TABLE_STRUCTURE_MODE!r}, expected one of {MODES}")
+    if _model is None or _model_backend != settings.INFERENCE_BACKEND:
         _feature_extractor = DetrFeatureExtractor()  # auto works too; this is stable
-        _model = TableTransformerForObjectDetection.from_pretrained(
-            "microsoft/table-transformer-structure-recognition"
-        )
-        _model.eval()
+        _model = load_model("table-structure", lambda: TableTransformerForObjectDetection.from_pretrained(MODEL_NAME),
+                            _source(MODEL_NAME))
+        _det_model = None
+        _model_backend = settings.INFERENCE_BACKEND
+    if settings.TABLE_STRUCTURE_MODE == "crop" and _det_model is None:
+        _det_model = load_model("table-detection",
+                                lambda: TableTransformerForObjectDetection.from_pretrained(DETECTION_MODEL_NAME),
+                                _source(DETECTION_MODEL_NAME))
 
-def _predict_boxes(img: Image.Image) -> List[dict]:
-    inputs = _feature_extractor(images=img, return_tensors="pt")
-    with torch.no_grad():
-        outputs = _model(**inputs)
-    target_sizes = torch.tensor([img.size[::-1]])  # (h,w)
-    results = _feature_extractor.post_process_object_detection(
-        outputs, threshold=0.6, target_sizes=target_sizes
-    )[0]
+def _to_preds(results: dict, labels: Sequence[str]) -> List[dict]:
     preds = []
     for score, label, box in zip(results["scores"], results["labels"], results["boxes"]):
         preds.append({
-            "label": LABELS[int(label)],
+            "label": labels[int(label)],
             "score": float(score),
             "box": tuple(box.tolist()),  # x0,y0,x1,y1
         })
     return preds
 
+def _predict_boxes_batch(imgs: List[np.ndarray], detect: bool = False, resize: bool = True) -> List[List[dict]]:
+    """
+    One forward pass for a batch of (h,w,3) uint8 page images; returns preds per image.
+    The feature extractor pads the batch to its largest image and masks the padding.
+    `detect` uses the table detection model instead of structure recognition;
+    `resize=False` feeds images at their own size (already scaled by the caller).
+    """
+    import torch
+    model, labels = (_det_model, _det_model.config.id2label) if detect else (_model, LABELS)
+    # arrays go to the feature extractor as-is, no PIL copy
+    inputs = _feature_extractor(images=imgs, do_resize=resize, return_tensors="pt")
+    with torch.no_grad():
+        outputs = model(**inputs)
+    target_sizes = torch.tensor([img.shape[:2] for img in imgs])  # (h,w)
+    results = _feature_extractor.post_process_object_detection(
+        outputs, threshold=0.6, target_sizes=target_sizes
+    )
+    return [_to_preds(r, labels) for r in results]
+
+def _predict_all(imgs: List[np.ndarray], batch_size: int, detect: bool = False,
+                 resize: bool = True) -> List[List[dict]]:
+    """
+    Predict every image in batches of `batch_size`. Images are bucketed by aspect ratio
+    (the extractor resizes them first) so each batch pads as little as possible;
+    output keeps input order.
+    """
+    batch_size = max(1, batch_size)
+    order = sorted(range(len(imgs)), key=lambda i: imgs[i].shape[0] / imgs[i].shape[1])
+    preds: List[List[dict]] = [[] for _ in imgs]
+    for start in range(0, len(order), batch_size):
+        chunk = order[start:start + batch_size]
+        for i, p in zip(chunk, _predict_boxes_batch([imgs[i] for i in chunk], detect, resize)):
+            preds[i] = p
+    return preds
+
 def _intersect(a, b):
     ax0, ay0, ax1, ay1 = a
     bx0, by0, bx1, by1 = b
@@ -51,46 +99,124 @@ def _intersect(a, b):
         return None
     return (x0, y0, x1, y1)
 
-def add_hf_tables(ir: DocIR, pdf_path: Path) -> DocIR:
+def _resize(img: np.ndarray, scale: float) -> np.ndarray:
+    import cv2
+    if scale == 1.0:
+        return img
+    h, w = img.shape[:2]
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+
+def _scale_box(box, scale: float, dx: float = 0.0, dy: float = 0.0) -> Tuple[float, float, float, float]:
+    """Box in an image scaled by `scale` and offset by (dx, dy) -> box in the original."""
+    x0, y0, x1, y1 = box
+    return (dx + x0 / scale, dy + y0 / scale, dx + x1 / scale, dy + y1 / scale)
+
+def _locate_tables(imgs: List[np.ndarray]) -> List[List[dict]]:
+    """Cheap first pass: table preds per page (page px) from the detection model on shrunk pages."""
+    scales = [min(1.0, settings.TABLE_LOCATE_MAX_PX / max(img.shape[:2])) for img in imgs]
+    preds = _predict_all([_resize(img, s) for img, s in zip(imgs, scales)],
+                         settings.TABLE_BATCH_SIZE, detect=True, resize=False)
+    return [
+        [{**p, "label": "table", "box": _scale_box(p["box"], s)} for p in page_preds
+         if p["label"].startswith("table")]
+        for page_preds, s in zip(preds, scales)
+    ]
+
+def _crop_scale(page_ir: PageIR, box, crop_shape: Tuple[int, ...]) -> float:
+    """
+    Scale for a table crop that brings the median height of the tokens inside the table
+    to settings.TABLE_TEXT_PX, keeping the crop within settings.TABLE_CROP_MAX_PX.
+    """
+    x0, y0, x1, y1 = box
+    tokens = page_ir.tokens
+    cx, cy = tokens.centers()
+    inside = (x0 <= cx) & (cx <= x1) & (y0 <= cy) & (cy <= y1)
+    heights = (tokens.y1 - tokens.y0)[inside]
+    scale = settings.TABLE_TEXT_PX / float(np.median(heights)) if heights.size else 1.0
+    return min(scale, settings.TABLE_CROP_MAX_PX / max(crop_shape[:2]))
+
+def _predict_crops(ir: DocIR, images: Dict[int, np.ndarray]) -> List[List[List[dict]]]:
+    """
+    Two-step structure recognition: locate tables, then run the structure model on each
+    padded table crop at a resolution picked from its text height.
+    Returns, per page and per located table, the preds in page px.
+    """
+    located = _locate_tables([images[p.page] for p in ir.pages])
+    crops: List[np.ndarray] = []
+    where = []  # (page position, located table pred, crop origin x, y, scale)
+    for pos, (page_ir, tables) in enumerate(zip(ir.pages, located)):
+        img = images[page_ir.page]
+        h, w = img.shape[:2]
+        for t in tables:
+            x0, y0, x1, y1 = t["box"]
+            cx0, cy0 = max(0, int(x0 - CROP_PAD_PX)), max(0, int(y0 - CROP_PAD_PX))
+            cx1, cy1 = min(w, int(np.ceil(x1 + CROP_PAD_PX))), min(h, int(np.ceil(y1 + CROP_PAD_PX)))
+            if cx1 <= cx0 or cy1 <= cy0:
+                continue
+            crop = img[cy0:cy1, cx0:cx1]
+            scale = _crop_scale(page_ir, t["box"], crop.shape)
+            crops.append(_resize(crop, scale))
+            where.append((pos, t, cx0, cy0, scale))
+
+    out: List[List[List[dict]]] = [[] for _ in ir.pages]
+    for (pos, t, dx, dy, scale), preds in zip(where, _predict_all(crops, settings.TABLE_BATCH_SIZE, resize=False)):
+        preds = [{**p, "box": _scale_box(p["box"], scale, dx, dy)} for p in preds]
+        if not any(p["label"] == "table" for p in preds):
+            preds.append(t)  # structure model saw rows/cols but no table: use the located box
+        out[pos].append(preds)
+    return out
+
+def _build_tables(page: int, preds: List[dict]) -> List[TableBlock]:
+    """Grid of cells (no text yet) for each "table" pred from the rows/columns inside it."""
+    tables = [p for p in preds if p["label"] == "table"]
+    rows   = [p for p in preds if p["label"] == "table row"]
+    cols   = [p for p in preds if p["label"] == "table column"]
+
+    page_tables: List[TableBlock] = []
+    for t in tables:
+        tbox = t["box"]
+        # rows/cols that lie inside this table box
+        t_rows = [r["box"] for r in rows if _intersect(r["box"], tbox)]
+        t_cols = [c["box"] for c in cols if _intersect(c["box"], tbox)]
+        # sort top-to-bottom / left-to-right
+        t_rows = sorted(t_rows, key=lambda b: (b[1] + b[3]) / 2.0)
+        t_cols = sorted(t_cols, key=lambda b: (b[0] + b[2]) / 2.0)
+
+        cells: List[TableCell] = []
+        for i, rbox in enumerate(t_rows):
+            for j, cbox in enumerate(t_cols):
+                ib = _intersect(rbox, cbox)
+                if not ib:
+                    # fallback small box within table if detection is imperfect
+                    ib = _intersect(rbox, tbox) if _intersect(rbox, cbox) is None else None
+                if ib:
+                    cells.append(TableCell(row=i, col=j, bbox=ib, page=page))
+        if cells:
+            page_tables.append(TableBlock(
+                page=page, bbox=tbox, cells=cells,
+                n_rows=len(t_rows), n_cols=len(t_cols)
+            ))
+    return page_tables
+
+def add_hf_tables(ir: DocIR, pdf_path: Path, images: Optional[Dict[int, np.ndarray]] = None) -> DocIR:
     """
     For each page, detect table, row, column boxes and build a grid of cells (no text yet).
+    `images` are the pages rendered at settings.RENDER_DPI (same pixel space as the tokens);
+    if not given, the pages are rendered here. With TABLE_STRUCTURE_MODE="crop" tables are
+    located first and only their crops go through structure recognition (needs the tokens
+    already in `ir` to size the crops).
     """
     _load_model()
-    doc = fitz.open(str(pdf_path))
-
-    for page_ir in ir.pages:
-        page = doc[page_ir.page]
-        pix = page.get_pixmap(dpi=200)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    if images is None:
+        images = render_pages(pdf_path, settings.RENDER_DPI, [p.page for p in ir.pages])
 
-        preds = _predict_boxes(img)
-        tables = [p for p in preds if p["label"] == "table"]
-        rows   = [p for p in preds if p["label"] == "table row"]
-        cols   = [p for p in preds if p["label"] == "table column"]
+    if settings.TABLE_STRUCTURE_MODE == "crop":
+        for page_ir, crops in zip(ir.pages, _predict_crops(ir, images)):
+            page_ir.tables = [tb for preds in crops for tb in _build_tables(page_ir.page, preds)]
+        return ir
 
-        page_tables: List[TableBlock] = []
-        for t in tables:
-            tbox = t["box"]
-            # rows/cols that lie inside this table box
-            t_rows = [r["box"] for r in rows if _intersect(r["box"], tbox)]
-            t_cols = [c["box"] for c in cols if _intersect(c["box"], tbox)]
-            # sort top-to-bottom / left-to-right
-            t_rows = sorted(t_rows, key=lambda b: (b[1] + b[3]) / 2.0)
-            t_cols = sorted(t_cols, key=lambda b: (b[0] + b[2]) / 2.0)
-
-            cells: List[TableCell] = []
-            for i, rbox in enumerate(t_rows):
-                for j, cbox in enumerate(t_cols):
-                    ib = _intersect(rbox, cbox)
-                    if not ib:
-                        # fallback small box within table if detection is imperfect
-                        ib = _intersect(rbox, tbox) if _intersect(rbox, cbox) is None else None
-                    if ib:
-                        cells.append(TableCell(row=i, col=j, bbox=ib, page=page_ir.page))
-            if cells:
-                page_tables.append(TableBlock(
-                    page=page_ir.page, bbox=tbox, cells=cells,
-                    n_rows=len(t_rows), n_cols=len(t_cols)
-                ))
-        page_ir.tables = page_tables
+    all_preds = _predict_all([images[p.page] for p in ir.pages], settings.TABLE_BATCH_SIZE)
+    for page_ir, preds in zip(ir.pages, all_preds):
+        page_ir.tables = _build_tables(page_ir.page, preds)
     return ir
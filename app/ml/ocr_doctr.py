@@ -1,43 +1,195 @@
 # app/ml/ocr_doctr.py
 from pathlib import Path
-from typing import List
-from doctr.io import DocumentFile
-from doctr.models import ocr_predictor
-from app.ir.schema import DocIR, PageIR, Token
+from typing import Dict, List, Optional, Tuple
+import fitz  # PyMuPDF
+import numpy as np
+from app.ir.schema import DocIR, PageIR, TokenArray
+from app.extractors import ocr_pytesseract
+from app.extractors.text_layer import text_layer_tokens, has_text_layer
+from app.pipeline.metrics import StageTimer
+from app.pipeline.render import FITZ_LOCK, page_size, render_page
+from app.ml.backend import load_model, package_version
+import settings
+
+# docTR's default detection / recognition architectures, pinned so they can be fingerprinted
+DET_ARCH = "db_resnet50"
+RECO_ARCH = "crnn_vgg16_bn"
+
+ENGINES = ("doctr", "cascade")
+# cascade: a page whose low-confidence lines span more than this fraction of its height
+# goes to docTR whole (cheaper than cutting it up)
+MAX_REGION_FRAC = 0.5
+REGION_GAP_PX = 32  # white space between the regions stacked into one docTR image
 
 # Single global model to avoid reload per page
 _model = None
+_model_backend = None
 
 def _get_model():
-    global _model
-    if _model is None:
-        _model = ocr_predictor(pretrained=True)  # PyTorch backend
-        _model.eval()
+    global _model, _model_backend
+    if _model is None or _model_backend != settings.INFERENCE_BACKEND:
+        from doctr.models import ocr_predictor  # heavy (torch), only when OCR is needed
+        _model = load_model(f"doctr-{DET_ARCH}-{RECO_ARCH}", lambda: ocr_predictor(
+            det_arch=DET_ARCH, reco_arch=RECO_ARCH, pretrained=True),  # PyTorch backend
+            [DET_ARCH, RECO_ARCH, package_version("python-doctr")])
+        _model_backend = settings.INFERENCE_BACKEND
     return _model
 
-def pdf_to_tokens_ir(pdf_path: Path) -> DocIR:
+def _doctr_tokens(page, p_idx: int, width: int, height: int) -> TokenArray:
+    texts: List[str] = []
+    rel: List[Tuple[float, float, float, float]] = []
+    for block in page.blocks:
+        for line in block.lines:
+            for word in line.words:
+                # geometry is relative (x0,y0,x1,y1) in 0..1
+                geometry = word.geometry
+                if len(geometry) != 4:
+                    print(f"Warning: word.geometry has {len(geometry)} values, expected 4. Values: {geometry}")
+                    continue
+                texts.append(word.value)
+                rel.append(tuple(geometry))
+    if not texts:
+        return TokenArray.empty()
+    boxes = np.array(rel, dtype=np.float64) * np.array([width, height, width, height], dtype=np.float64)
+    return TokenArray(texts, boxes, np.full(len(texts), p_idx))
+
+def _take(tokens: TokenArray, idx: List[int]) -> TokenArray:
+    return TokenArray([tokens.text[i] for i in idx], tokens.boxes[idx], tokens.page[idx])
+
+def _low_conf_regions(tokens: TokenArray, conf: np.ndarray, height: int) -> List[Tuple[int, int]]:
+    """Merged horizontal bands (y0, y1 in px) around the words below OCR_MIN_WORD_CONF."""
+    low = conf < settings.OCR_MIN_WORD_CONF
+    if not low.any():
+        return []
+    pad = 0.5 * float(np.median(tokens.y1 - tokens.y0))
+    regions: List[List[int]] = []
+    for y0, y1 in sorted(tokens.boxes[low][:, [1, 3]].tolist()):
+        y0, y1 = max(0, int(y0 - pad)), min(height, int(np.ceil(y1 + pad)))
+        if regions and y0 <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], y1)
+        else:
+            regions.append([y0, y1])
+    return [(y0, y1) for y0, y1 in regions]
+
+def _stack_regions(img: np.ndarray, regions: List[Tuple[int, int]]) -> Tuple[np.ndarray, List[int]]:
+    """The page's regions (full width) one under the other on white; their offsets in the stack."""
+    offsets, y = [], 0
+    for y0, y1 in regions:
+        offsets.append(y)
+        y += y1 - y0 + REGION_GAP_PX
+    stack = np.full((y, img.shape[1]) + img.shape[2:], 255, dtype=img.dtype)
+    for (y0, y1), off in zip(regions, offsets):
+        stack[off:off + y1 - y0] = img[y0:y1]
+    return stack, offsets
+
+def _unstack(tokens: TokenArray, regions: List[Tuple[int, int]], offsets: List[int]) -> TokenArray:
+    """docTR tokens of a region stack back in page coords (words in the gaps are dropped)."""
+    _, cy = tokens.centers()
+    keep, dy = [], []
+    for i, y in enumerate(cy.tolist()):
+        for (y0, y1), off in zip(regions, offsets):
+            if off <= y < off + y1 - y0:
+                keep.append(i)
+                dy.append(y0 - off)
+                break
+    moved = _take(tokens, keep)
+    moved.boxes[:, [1, 3]] += np.asarray(dy, dtype=np.float64)[:, None]
+    return moved
+
+def _cascade(out: List[PageIR], ocr_pos: List[int], ocr_imgs: List[np.ndarray],
+             timer: StageTimer) -> None:
+    """
+    Tesseract on every page (in parallel), then docTR only where Tesseract is unsure:
+    pages with no words or more than OCR_ESCALATE_PAGE_FRAC low-confidence words are
+    redone whole ("doctr"); otherwise just the lines holding low-confidence words are,
+    stacked into one image per page ("tesseract+doctr"), and replace Tesseract's words
+    there. Pages Tesseract is sure of keep its tokens ("tesseract").
     """
-    OCR each page once; return tokens with absolute pixel coords.
+    with timer.stage("ocr_tesseract"):
+        first = ocr_pytesseract.tesseract_pages(ocr_imgs, [out[pos].page for pos in ocr_pos])
+    jobs = []  # (pos, image for docTR, regions or None for the whole page, offsets)
+    for pos, img, (tokens, conf) in zip(ocr_pos, ocr_imgs, first):
+        page_ir = out[pos]
+        page_ir.tokens, page_ir.token_source = tokens, "tesseract"
+        if not len(tokens) or (conf < settings.OCR_MIN_WORD_CONF).mean() > settings.OCR_ESCALATE_PAGE_FRAC:
+            jobs.append((pos, img, None, None))
+            continue
+        regions = _low_conf_regions(tokens, conf, page_ir.height)
+        if sum(y1 - y0 for y0, y1 in regions) > MAX_REGION_FRAC * page_ir.height:
+            jobs.append((pos, img, None, None))
+        elif regions:
+            stack, offsets = _stack_regions(img, regions)
+            jobs.append((pos, stack, regions, offsets))
+    if not jobs:
+        return
+    with timer.stage("ocr_doctr"):
+        result = _get_model()([img for _, img, _, _ in jobs])
+    for (pos, img, regions, offsets), page in zip(jobs, result.pages):
+        page_ir = out[pos]
+        height, width = img.shape[:2]
+        tokens = _doctr_tokens(page, page_ir.page, width, height)
+        if regions is None:
+            page_ir.tokens, page_ir.token_source = tokens, "doctr"
+            continue
+        _, cy = page_ir.tokens.centers()
+        outside = np.ones(len(cy), dtype=bool)
+        for y0, y1 in regions:
+            outside &= ~((y0 <= cy) & (cy < y1))
+        kept = _take(page_ir.tokens, np.flatnonzero(outside).tolist())
+        page_ir.tokens = TokenArray.concat([kept, _unstack(tokens, regions, offsets)])
+        page_ir.token_source = "tesseract+doctr"
+
+def pdf_to_tokens_ir(pdf_path: Path, images: Optional[Dict[int, np.ndarray]] = None,
+                     pages: Optional[List[int]] = None, timer: Optional[StageTimer] = None) -> DocIR:
     """
-    doc = DocumentFile.from_pdf(str(pdf_path))
-    model = _get_model()
-    result = model(doc)
-
-    pages: List[PageIR] = []
-    for p_idx, page in enumerate(result.pages):
-        width, height = page.dimensions  # pixels
-        tokens: List[Token] = []
-        for block in page.blocks:
-            for line in block.lines:
-                for word in line.words:
-                    # geometry is relative (x0,y0,x1,y1) in 0..1
-                    geometry = word.geometry
-                    if len(geometry) != 4:
-                        print(f"Warning: word.geometry has {len(geometry)} values, expected 4. Values: {geometry}")
-                        continue
-                    (rx0, ry0, rx1, ry1) = geometry
-                    x0, y0 = rx0 * width, ry0 * height
-                    x1, y1 = rx1 * width, ry1 * height
-                    tokens.append(Token(text=word.value, x0=x0, y0=y0, x1=x1, y1=y1, page=p_idx))
-        pages.append(PageIR(page=p_idx, width=width, height=height, tokens=tokens, tables=[]))
-    return DocIR(pages=pages)
+    Tokens for each page, in absolute pixel coords at settings.RENDER_DPI.
+    Born-digital pages use the PDF text layer; the rest are OCR'd once with docTR, or
+    with OCR_ENGINE="cascade" by Tesseract first, escalating to docTR where it is unsure
+    (see _cascade; PageIR.token_source records the engine per page).
+    `images` are the pages already rendered at RENDER_DPI (see app.pipeline.render);
+    pages are rendered here only if they are not given.
+    `pages` restricts processing to those page indices (default: all).
+    `timer` receives the time spent per engine ("ocr_tesseract", "ocr_doctr").
+    """
+    if settings.OCR_ENGINE not in ENGINES:
+        raise ValueError(f"Unknown OCR_ENGINE {settings.OCR_ENGINE!r}, expected one of {ENGINES}")
+    timer = timer or StageTimer()
+    dpi = settings.RENDER_DPI
+    out: List[PageIR] = []
+    ocr_pos: List[int] = []
+    ocr_imgs: List[np.ndarray] = []
+    with FITZ_LOCK, fitz.open(str(pdf_path)) as doc:
+        for p_idx in (range(len(doc)) if pages is None else pages):
+            page = doc[p_idx]
+            img = images.get(p_idx) if images is not None else None
+            tokens = TokenArray.empty()
+            source = "doctr"
+            if settings.USE_TEXT_LAYER:
+                tokens = text_layer_tokens(page, p_idx, dpi)
+                if has_text_layer(tokens, settings.TEXT_LAYER_MIN_WORDS):
+                    source = "text_layer"
+            if source == "doctr":
+                if img is None:
+                    img = render_page(page, dpi)
+                ocr_pos.append(len(out))
+                ocr_imgs.append(img)
+                tokens = TokenArray.empty()  # filled in by docTR below
+            # page size in pixels at `dpi`, same as the rendered image
+            if img is not None:
+                height, width = img.shape[:2]
+            else:
+                width, height = page_size(page, dpi)
+            out.append(PageIR(page=p_idx, width=width, height=height,
+                              tokens=tokens, tables=[], token_source=source))
+
+    if not ocr_imgs:
+        return DocIR(pages=out)
+    if settings.OCR_ENGINE == "cascade" and ocr_pytesseract.version():
+        _cascade(out, ocr_pos, ocr_imgs, timer)
+    else:
+        with timer.stage("ocr_doctr"):
+            result = _get_model()(ocr_imgs)
+        for pos, page in zip(ocr_pos, result.pages):
+            page_ir = out[pos]
+            page_ir.tokens = _doctr_tokens(page, page_ir.page, page_ir.width, page_ir.height)
+    return DocIR(pages=out)
@@ -1,147 +1,219 @@
 # app/parsers/hf_table_to_rows.py
 import re
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple
-from app.ir.schema import DocIR, TableBlock, TableCell, Token
+from typing import List, Tuple
+from app.ir.schema import DocIR, PageIR, TableBlock, TableCell, TokenArray
 from app.io.schema import LineItem
 
 RE_ACC = re.compile(r"^\d{4,8}$")
 RE_YEAR = re.compile(r"\b(19|20)\d{2}\b")
 RE_NUM = re.compile(r"[-–—]?\s*\(?\s*[\d\s.\u00A0’']+(?:[.,]\d{1,2})?\s*\)?$")
 
-def _inside(cell: TableCell, tok: Token) -> bool:
-    x0,y0,x1,y1 = cell.bbox
-    cx = (tok.x0 + tok.x1) / 2.0
-    cy = (tok.y0 + tok.y1) / 2.0
-    return (x0 <= cx <= x1) and (y0 <= cy <= y1)
-
-def _join_tokens_text(tokens: List[Token]) -> str:
-    return " ".join(t.text for t in sorted(tokens, key=lambda t: (t.y0, t.x0)))
-
-def _normalize_number(tok: str) -> float | None:
-    s = tok
-    s = s.replace("\u00A0"," ").replace("’","").replace("'","")
-    s = s.replace("€","").replace("EUR","").replace("eur","")
-    s = s.strip()
-    neg = False
-    if "(" in s and ")" in s:
-        neg = True
-        s = s.replace("(","").replace(")","")
-    s = s.lstrip("–—-").strip()
-    # both dot & comma → '.' thousands, ',' decimal
-    if "," in s and "." in s:
-        s = s.replace(".","").replace(",",".")
-    else:
-        # single comma as decimal
-        if s.count(",")==1 and len(s.split(",")[-1]) in (1,2):
-            s = s.replace(",",".")
-        else:
-            s = s.replace(" ","").replace(".","")
+def _index_tokens(tokens: TokenArray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Token indices sorted by vertical centre, plus those centres, built once per page
+    so each cell only looks at the tokens in its own y-band.
+    """
+    _, cy = tokens.centers()
+    order = np.argsort(cy, kind="stable")
+    return cy[order], order
+
+def _tokens_in_cell(cell: TableCell, cx: np.ndarray, cys: np.ndarray, order: np.ndarray) -> np.ndarray:
+    """Indices of the tokens whose centre lies inside the cell (edges included), in original token order."""
+    x0, y0, x1, y1 = cell.bbox
+    lo, hi = np.searchsorted(cys, y0, side="left"), np.searchsorted(cys, y1, side="right")
+    band = order[lo:hi]
+    return np.sort(band[(x0 <= cx[band]) & (cx[band] <= x1)])
+
+def _join_tokens_text(tokens: TokenArray, idx: np.ndarray) -> str:
+    # reading order: top-to-bottom, then left-to-right (stable for ties)
+    idx = idx[np.lexsort((tokens.x0[idx], tokens.y0[idx]))]
+    return " ".join(tokens.text[i] for i in idx.tolist())
+
+def _to_float(s: str) -> float | None:
     try:
-        val = float(s)
-        return -val if neg else val
+        return float(s)
     except ValueError:
         return None
 
-def _header_years_from_top_row(df: pd.DataFrame) -> Dict[int,int]:
+def _normalize_numbers(raw: pd.Series) -> pd.Series:
+    """
+    Belgian/European amounts -> float (NaN where unparseable), column-wise:
+    '1.234,56' / '1 234,56' / '(1.234)' / '-1.234,56' / '- 12,5 EUR'.
+    """
+    s = raw.astype(object)
+    for old, new in (("\u00A0"," "), ("’",""), ("'",""), ("€",""), ("EUR",""), ("eur","")):
+        s = s.str.replace(old, new, regex=False)
+    s = s.str.strip()
+    neg = (s.str.contains("(", regex=False) & s.str.contains(")", regex=False)) | s.str.match("[-–—]")
+    s = s.where(~neg, s.str.replace("(", "", regex=False).str.replace(")", "", regex=False))
+    s = s.str.lstrip("–—-").str.strip()
+    # both dot & comma → '.' thousands, ',' decimal
+    both = s.str.contains(",", regex=False) & s.str.contains(".", regex=False)
+    # single comma as decimal
+    decimals = s.str.len() - s.str.rfind(",") - 1
+    dec_comma = ~both & (s.str.count(",") == 1) & decimals.isin((1, 2))
+    s = s.mask(both, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    s = s.mask(dec_comma, s.str.replace(",", ".", regex=False))
+    s = s.mask(~both & ~dec_comma, s.str.replace(" ", "", regex=False).str.replace(".", "", regex=False))
+    val = pd.Series([_to_float(x) for x in s.tolist()], index=s.index, dtype=float)
+    return val.where(~neg, -val)
+
+def _cells_frame(pages: List[PageIR]) -> pd.DataFrame:
     """
-    Look for years in top 2 rows to map columns -> fiscal_year.
-    Return dict col_index -> year.
+    Every grid position of every table as one long frame
+    (page, table, row, col, text), "" where the structure model gave no cell.
     """
-    mapping = {}
-    for r in range(min(2, len(df))):
-        for c in range(df.shape[1]):
-            m = RE_YEAR.search(str(df.iat[r,c]))
-            if m:
-                mapping[c] = int(m.group(0))
-    return mapping
-
-def _best_amount_col_idx(df: pd.DataFrame) -> int | None:
+    parts = []
+    for page in pages:
+        for tb in page.tables:
+            grid = np.full((tb.n_rows, tb.n_cols), "", dtype=object)
+            for cell in tb.cells:
+                if 0 <= cell.row < tb.n_rows and 0 <= cell.col < tb.n_cols:
+                    grid[cell.row, cell.col] = cell.text.strip()
+            rows, cols = np.indices(grid.shape)
+            parts.append(pd.DataFrame({
+                "page": page.page, "table": len(parts),
+                "row": rows.ravel(), "col": cols.ravel(), "text": grid.ravel(),
+            }))
+    if not parts:
+        return pd.DataFrame(columns=["page", "table", "row", "col", "text"])
+    return pd.concat(parts, ignore_index=True)
+
+def _header_years(cells: pd.DataFrame) -> pd.DataFrame:
+    """
+    Look for years in top 2 rows to map columns -> fiscal_year (row 1 wins over row 0).
+    Return frame (table, col, year).
+    """
+    top = cells[(cells["row"] < 2) & cells["year"].notna()]
+    top = top.sort_values(["table", "col", "row"]).drop_duplicates(["table", "col"], keep="last")
+    return top[["table", "col", "year"]]
+
+def _best_amount_cols(cells: pd.DataFrame) -> pd.DataFrame:
     """
     If no year headers, pick the right-most column with most numeric-looking cells.
+    Return frame (table, col, year=NaN).
     """
-    best = None; best_score = -1
-    for c in range(df.shape[1]-1, -1, -1):
-        col = df.iloc[:,c].astype(str)
-        score = sum(bool(RE_NUM.search(x)) for x in col)
-        if score > best_score:
-            best_score = score; best = c
-    return best
+    score = cells.groupby(["table", "col"], as_index=False)["is_num"].sum()
+    score = score.sort_values(["table", "is_num", "col"], ascending=[True, False, False])
+    best = score.drop_duplicates("table")[["table", "col"]]
+    return best.assign(year=np.nan)
 
-def tables_to_lineitems(ir: DocIR) -> List[LineItem]:
-    items: List[LineItem] = []
+def _account_cols(cells: pd.DataFrame) -> pd.DataFrame:
+    """
+    First column with most account numbers (at least 2) per table, plus the name column:
+    the leftmost non-account column among the first two. Return frame (table, acc_col, name_col).
+    """
+    hits = cells.groupby(["table", "col"], as_index=False)["is_acc"].sum()
+    hits = hits[hits["is_acc"] > 1].sort_values(["table", "is_acc", "col"], ascending=[True, False, True])
+    acc = hits.drop_duplicates("table")[["table", "col"]].rename(columns={"col": "acc_col"})
+    n_cols = cells.groupby("table", as_index=False)["col"].max()
+    acc = acc.merge(n_cols.rename(columns={"col": "last_col"}), on="table")
+    acc["name_col"] = np.where((acc["acc_col"] == 0) & (acc["last_col"] > 0), 1, 0)
+    return acc[["table", "acc_col", "name_col"]]
+
+def _apply_roles(blocks: List[TableBlock], years: pd.DataFrame, amount_cols: pd.DataFrame,
+                 accounts: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Tables that already have roles (grids reused from a stored layout, see
+    app.pipeline.layouts) keep the account/name/amount columns found when the layout was
+    first parsed; their header years are still read from this document.
+    The other tables get the roles just found recorded on them.
+    """
+    acc_by_table = accounts.set_index("table")
+    cols_by_table = amount_cols.groupby("table")["col"].apply(lambda c: sorted(int(x) for x in c))
+    year_tables = set(years["table"])
+    fixed = []
+    for t, tb in enumerate(blocks):
+        if tb.roles is not None:
+            fixed.append(t)
+            continue
+        tb.roles = {
+            "acc_col": int(acc_by_table.at[t, "acc_col"]) if t in acc_by_table.index else None,
+            "name_col": int(acc_by_table.at[t, "name_col"]) if t in acc_by_table.index else None,
+            "amount_cols": cols_by_table.get(t, []),
+            "year_headers": t in year_tables,
+        }
+    if not fixed:
+        return amount_cols, accounts
+    roles = [(t, blocks[t].roles) for t in fixed]
+    fixed_acc = pd.DataFrame([(t, r["acc_col"], r["name_col"]) for t, r in roles if r["acc_col"] is not None],
+                             columns=["table", "acc_col", "name_col"]).astype(int)
+    fixed_cols = pd.DataFrame([(t, c) for t, r in roles for c in r["amount_cols"]], columns=["table", "col"]).astype(int)
+    fixed_cols = fixed_cols.merge(years[years["table"].isin([t for t, r in roles if r["year_headers"]])],
+                                  on=["table", "col"], how="left")
+    return (pd.concat([amount_cols[~amount_cols["table"].isin(fixed)], fixed_cols], ignore_index=True),
+            pd.concat([accounts[~accounts["table"].isin(fixed)], fixed_acc], ignore_index=True))
+
+def _parse_tables(pages: List[PageIR]) -> List[LineItem]:
+    """Line items of all tables on the given pages, whose cells already have text."""
+    cells = _cells_frame(pages)
+    if cells.empty:
+        return []
+    text = cells["text"].astype(object)  # python re semantics, not the arrow regex engine
+    cells["is_num"] = text.str.contains(RE_NUM)
+    cells["is_acc"] = text.str.contains(RE_ACC)
+    cells["year"] = pd.to_numeric(text.str.extract(f"({RE_YEAR.pattern})")[0])
+    # if a row looks like “total/subtotal” skip it
+    cells["is_total"] = text.str.contains(r"(?:total|totaal|subtotal|som|saldo|grand total)", flags=re.I)
+
+    # Map columns: try year headers; else pick numeric right-most
+    years = _header_years(cells)
+    amount_cols = pd.concat([years, _best_amount_cols(cells[~cells["table"].isin(years["table"])])])
+
+    # Data rows (skip the first, likely header): account number in the account column, no total
+    accounts = _account_cols(cells)
+    blocks = [tb for page in pages for tb in page.tables]  # table t of `cells` is blocks[t]
+    amount_cols, accounts = _apply_roles(blocks, years, amount_cols, accounts)
+    body = cells[cells["row"] >= 1]
+    rows = body.merge(accounts, on="table")
+    acc = rows[(rows["col"] == rows["acc_col"]) & rows["is_acc"]][["table", "row", "text"]]
+    names = rows[rows["col"] == rows["name_col"]][["table", "row", "text"]]
+    totals = body.groupby(["table", "row"], as_index=False)["is_total"].any()
+    # try infer from the first year token in the row
+    row_years = body[body["year"].notna()].sort_values(["table", "row", "col"]).drop_duplicates(["table", "row"])
+    rows = (acc.rename(columns={"text": "acc"})
+            .merge(names.rename(columns={"text": "name"}), on=["table", "row"])
+            .merge(totals[~totals["is_total"]][["table", "row"]], on=["table", "row"])
+            .merge(row_years[["table", "row", "year"]].rename(columns={"year": "row_year"}), on=["table", "row"], how="left"))
+
+    # For each amount column, emit one item
+    amounts = body[(body["text"] != "") & body["is_num"]][["page", "table", "row", "col", "text"]]
+    amounts = amounts.merge(amount_cols, on=["table", "col"]).merge(rows, on=["table", "row"])
+    amounts["amount"] = _normalize_numbers(amounts["text"])
+    amounts = amounts[amounts["amount"].notna()].sort_values(["table", "row", "col"])
+    fy = amounts["year"].fillna(amounts["row_year"]).fillna(0).astype(int)
+
+    return [
+        LineItem(
+            rekeningnummer=acc, postnaam=name, amount=amt,
+            fiscal_year=year, currency="EUR",
+            source_page=pg, confidence=0.75
+        )
+        for pg, acc, name, amt, year in zip(
+            amounts["page"].tolist(), amounts["acc"].tolist(), amounts["name"].tolist(),
+            amounts["amount"].tolist(), fy.tolist(),
+        )
+    ]
+
+def assign_tokens(page: PageIR) -> None:
+    """Fill each table cell's text from the page tokens whose centre lies inside it."""
+    if not page.tables:
+        return
+    tokens = page.tokens
+    cx, _ = tokens.centers()
+    cys, order = _index_tokens(tokens)
+    for tb in page.tables:
+        for cell in tb.cells:
+            cell.text = _join_tokens_text(tokens, _tokens_in_cell(cell, cx, cys, order))
+
+def page_to_lineitems(page: PageIR) -> List[LineItem]:
+    """Line items of one page whose cells already have text (see assign_tokens)."""
+    return _parse_tables([page])
 
+def tables_to_lineitems(ir: DocIR) -> List[LineItem]:
+    # 1) Fill cell text from OCR tokens, 2) parse all tables of the document in one pass
     for page in ir.pages:
-        # 1) Fill cell text from OCR tokens
-        for tb in page.tables:
-            # assign tokens to each cell
-            for cell in tb.cells:
-                tokens = [tok for tok in page.tokens if _inside(cell, tok)]
-                cell.text = _join_tokens_text(tokens)
-
-            # 2) Build a DataFrame view of the table
-            n_rows = tb.n_rows; n_cols = tb.n_cols
-            grid = [["" for _ in range(n_cols)] for _ in range(n_rows)]
-            for cell in tb.cells:
-                if 0 <= cell.row < n_rows and 0 <= cell.col < n_cols:
-                    grid[cell.row][cell.col] = cell.text.strip()
-            df = pd.DataFrame(grid)
-
-            # 3) Map columns: try year headers; else pick numeric right-most
-            col_to_year = _header_years_from_top_row(df)
-            amount_cols: List[Tuple[int,int|None]] = []  # (col_idx, year or None)
-
-            if col_to_year:
-                for c, y in sorted(col_to_year.items()):
-                    amount_cols.append((c, y))
-            else:
-                c = _best_amount_col_idx(df)
-                if c is not None:
-                    amount_cols.append((c, None))
-
-            # 4) Identify account + name columns
-            # heuristic: first column with many acc numbers is acc; the adjacent leftmost text is name
-            acc_col = None
-            best_hits = -1
-            for c in range(df.shape[1]):
-                hits = sum(bool(RE_ACC.match(str(x).strip())) for x in df.iloc[:,c])
-                if hits > best_hits and hits > 1:
-                    best_hits = hits; acc_col = c
-
-            # name col: choose the leftmost non-acc col among first two columns
-            name_col = 0 if acc_col != 0 else (1 if df.shape[1] > 1 else 0)
-
-            # 5) Iterate data rows (skip header rows)
-            start_row = 1  # skip first row (likely header)
-            for r in range(start_row, df.shape[0]):
-                acc = str(df.iat[r, acc_col]).strip() if acc_col is not None else ""
-                if not RE_ACC.match(acc):
-                    continue
-                name = str(df.iat[r, name_col]).strip() if name_col is not None else ""
-
-                # For each amount column, emit one item
-                row_text_all = " ".join(str(x) for x in df.iloc[r,:].tolist())
-                # if looks like “total/subtotal” skip
-                if re.search(r"(total|totaal|subtotal|som|saldo|grand total)", row_text_all, flags=re.I):
-                    continue
-
-                for c, year in amount_cols:
-                    raw = str(df.iat[r, c]).strip()
-                    if not raw or not RE_NUM.search(raw):
-                        continue
-                    amt = _normalize_number(raw)
-                    if amt is None:
-                        continue
-
-                    fy = year
-                    if fy is None:
-                        # try infer from any year token in the row
-                        m = RE_YEAR.search(row_text_all)
-                        fy = int(m.group(0)) if m else 0
-
-                    items.append(LineItem(
-                        rekeningnummer=acc, postnaam=name, amount=amt,
-                        fiscal_year=int(fy) if fy else 0, currency="EUR",
-                        source_page=page.page, confidence=0.75
-                    ))
-    return items
+        assign_tokens(page)
+    return _parse_tables(ir.pages)
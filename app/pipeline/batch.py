@@ -0,0 +1,125 @@
+# app/pipeline/batch.py
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing as mp
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+import pandas as pd
+
+def torch_threads_per_worker(n_workers: int, configured: int = 0) -> int:
+    """Intra-op threads per worker so n_workers processes don't oversubscribe the cores."""
+    if configured > 0:
+        return configured
+    return max(1, (os.cpu_count() or 1) // max(1, n_workers))
+
+def expand_inputs(inputs: Iterable[str]) -> List[Path]:
+    """Files, directories (their *.pdf) and glob patterns like Data/*.pdf -> sorted unique PDFs."""
+    out = set()
+    for arg in inputs:
+        p = Path(arg)
+        if p.is_dir():
+            out.update(p.glob("*.pdf"))
+        elif p.is_file():
+            out.add(p)
+        else:
+            out.update(Path(x) for x in glob.glob(arg, recursive=True) if Path(x).is_file())
+    return sorted(out)
+
+def out_path(pdf_path: Path, out_dir: Optional[Path], fmt: str = "csv") -> Path:
+    if out_dir is None:
+        return pdf_path.with_suffix(f".extracted.{fmt}")
+    return out_dir / f"{pdf_path.stem}.extracted.{fmt}"
+
+def load_company_map(path: Path) -> Dict[str, str]:
+    """`file;company` CSV (file: PDF name, with or without .pdf) -> {PDF stem: company}."""
+    df = pd.read_csv(path, sep=";", dtype=str).dropna(subset=["file", "company"])
+    return {Path(f).stem if f.lower().endswith(".pdf") else f: c for f, c in zip(df["file"], df["company"])}
+
+def company_of(pdf_path: Path, diagnostics: dict, company: Optional[str] = None,
+               company_map: Optional[Dict[str, str]] = None) -> str:
+    """
+    Company key of a document in the dataset, which is what joins its years with other
+    documents: its `company_map` entry, else `company`, else the enterprise number found
+    in the report (diagnostics["company_number"]), else the PDF name.
+    """
+    return ((company_map or {}).get(pdf_path.stem) or company
+            or diagnostics.get("company_number") or pdf_path.stem)
+
+def write_outputs(items: list, pdf_path: Path, out_dir: Optional[Path], fmt: str = "csv",
+                  dataset: Optional[Path] = None, partition_by: Sequence[str] = ("fiscal_year",),
+                  company: Optional[str] = None) -> Path:
+    """
+    Write one document's items: a wide table per file (`fmt` "csv" or "parquet") and,
+    if `dataset` is given, append them (long layout) to that Parquet dataset.
+    `company` defaults to the PDF name (see company_of).
+    """
+    from app.io.export import append_dataset, to_csv_wide, to_parquet
+    out = out_path(pdf_path, out_dir, fmt)
+    if fmt == "parquet":
+        to_parquet(items, out, layout="wide", document=pdf_path.stem, company=company)
+    else:
+        to_csv_wide(items, out)
+    if dataset is not None:
+        append_dataset(items, dataset, document=pdf_path.stem, company=company, partition_by=partition_by)
+    return out
+
+# model load seconds of this worker process, reported with the first document it runs
+_load_times: Dict[str, float] = {}
+
+def _init_worker(torch_threads: int) -> None:
+    from app.pipeline.pipeline import load_models
+    _load_times.update(load_models(torch_threads))
+
+def _process(pdf_path: Path, out_dir: Optional[Path], use_cache: bool, fmt: str,
+             dataset: Optional[Path], partition_by: Sequence[str], company: Optional[str],
+             company_map: Optional[Dict[str, str]]) -> dict:
+    from app.pipeline.pipeline import run_pipeline
+    t0 = time.perf_counter()
+    row = {"file": str(pdf_path), "status": "ok", "error": "", "seconds": 0.0,
+           "n_pages": 0, "n_items": 0, "cache": "", "company": "", "out_file": ""}
+    try:
+        result = run_pipeline(pdf_path, use_cache=use_cache)
+        row["company"] = company_of(pdf_path, result.diagnostics, company, company_map)
+        if result.items:
+            out = write_outputs(result.items, pdf_path, out_dir, fmt, dataset, partition_by, row["company"])
+            row["out_file"] = str(out)
+        row.update(n_pages=result.diagnostics.get("n_pages", 0), n_items=len(result.items),
+                   cache=result.diagnostics.get("cache", ""))
+    except Exception as e:
+        row.update(status="failed", error=f"{type(e).__name__}: {e}")
+    row["seconds"] = round(time.perf_counter() - t0, 3)
+    row.update({f"load_{name}_s": round(s, 3) for name, s in _load_times.items()})
+    _load_times.clear()
+    return row
+
+def run_batch(pdfs: List[Path], workers: int, out_dir: Optional[Path] = None,
+              use_cache: bool = True, torch_threads: int = 0, fmt: str = "csv",
+              dataset: Optional[Path] = None, partition_by: Sequence[str] = ("fiscal_year",),
+              company: Optional[str] = None, company_map: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Run the pipeline over many PDFs in `workers` processes, each loading the models once.
+    Writes one wide CSV/Parquet per file (plus the shared Parquet `dataset`, if given)
+    and returns a per-file summary (timings, failures; load_<model>_s on the first file of
+    each worker holds its model load time). Each PDF's company in the dataset
+    comes from `company_map`, `company` or the report itself (see company_of).
+    """
+    if out_dir is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(workers, len(pdfs) or 1))
+    threads = torch_threads_per_worker(workers, torch_threads)
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(threads,)) as ex:
+        futures = {ex.submit(_process, p, out_dir, use_cache, fmt, dataset, tuple(partition_by), company, company_map): p for p in pdfs}
+        for fut in as_completed(futures):
+            try:
+                row = fut.result()
+            except BrokenProcessPool as e:
+                row = {"file": str(futures[fut]), "status": "failed", "error": f"worker crashed: {e}"}
+            rows.append(row)
+            print(f"[{len(rows)}/{len(pdfs)}] {row['status']:6} {row['file']} "
+                  f"({row.get('n_items', 0)} items, {row.get('seconds', 0)}s) {row.get('error', '')}")
+    return pd.DataFrame(rows)
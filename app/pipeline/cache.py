@@ -0,0 +1,128 @@
+# app/pipeline/cache.py
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from app.ir.schema import DocIR, PageIR
+from app.io.schema import ExtractionResult
+import settings
+
+def make_key(content, fingerprint: dict) -> str:
+    """
+    Content address: hash of `content` (PDF bytes, or a rendered page buffer) plus
+    everything that changes the output (model ids/versions, settings) in `fingerprint`.
+    """
+    h = hashlib.sha256(content)
+    h.update(json.dumps(fingerprint, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+def file_key(path: Path, fingerprint: dict) -> str:
+    """make_key of a file's bytes, hashed in chunks instead of reading it whole."""
+    with open(path, "rb") as f:
+        h = hashlib.file_digest(f, "sha256")
+    h.update(json.dumps(fingerprint, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+def _dir(kind: str) -> Path:
+    d = Path(settings.CACHE_DIR) / kind
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def _read(kind: str, key: str) -> Optional[dict]:
+    path = _dir(kind) / f"{key}.json"
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[cache] dropping unreadable entry {kind}/{path.name}: {e}")
+        path.unlink(missing_ok=True)
+        return None
+    try:
+        os.utime(path)  # mark as recently used
+    except FileNotFoundError:
+        pass  # evicted meanwhile (another worker / pipeline thread)
+    return data
+
+def _write(kind: str, key: str, data: dict) -> None:
+    d = _dir(kind)
+    # own temp file per writer, then an atomic rename: workers storing the same key
+    # concurrently each publish a whole file (the last one wins)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=f"{key}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, d / f"{key}.json")
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+def _evict(d: Path, max_bytes: int) -> None:
+    """Drop least-recently-used entries until the directory fits in `max_bytes`."""
+    entries = []
+    for p in d.glob("*.json"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        p.unlink(missing_ok=True)
+        total -= size
+
+# --- whole-document results ---
+
+def load(key: str) -> Optional[Tuple[DocIR, ExtractionResult]]:
+    data = _read("results", key)
+    if data is None:
+        return None
+    try:
+        return DocIR.model_validate(data["ir"]), ExtractionResult.model_validate(data["result"])
+    except Exception as e:
+        print(f"[cache] invalid result entry {key}: {e}")
+        return None
+
+def store(key: str, ir: DocIR, result: ExtractionResult) -> None:
+    _write("results", key, {
+        "ir": ir.model_dump(mode="json"),
+        "result": result.model_dump(mode="json"),
+    })
+    _evict(_dir("results"), settings.RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# --- per-page OCR + table structure ---
+
+def load_page(key: str, page_idx: int) -> Optional[PageIR]:
+    """Cached PageIR (tokens + tables), renumbered to `page_idx` in the current document."""
+    data = _read("pages", key)
+    if data is None:
+        return None
+    try:
+        page = PageIR.model_validate(data)
+    except Exception as e:
+        print(f"[cache] invalid page entry {key}: {e}")
+        return None
+    page.page = page_idx
+    page.tokens.page[:] = page_idx
+    for tb in page.tables:
+        tb.page = page_idx
+        tb.roles = None  # parser's choice, not part of the structure (see store_pages)
+        for cell in tb.cells:
+            cell.page = page_idx
+            cell.text = ""
+    return page
+
+def store_pages(pages: Dict[str, PageIR]) -> None:
+    """
+    Store freshly processed pages by key; evicts once for the whole batch.
+    Column roles from a reused layout are left out: page entries outlive PIPELINE_VERSION,
+    so cached pages must be parsed with the current heuristics.
+    """
+    for key, page in pages.items():
+        _write("pages", key, page.model_dump(mode="json", exclude={"tables": {"__all__": {"roles"}}}))
+    if pages:
+        _evict(_dir("pages"), settings.PAGE_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,118 @@
+# app/pipeline/executor.py
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Sequence
+
+_DONE = object()  # end-of-stream marker, one per downstream thread
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Any], Any]
+    threads: int = 1
+
+def run_stages(source: Iterable, stages: Sequence[Stage], queue_size: int = 2,
+               overlap: bool = True) -> Iterator:
+    """
+    Push every item of `source` through `stages` and yield the results in source order.
+    Stages are connected by queues of at most `queue_size` items and each stage runs in
+    its own `threads` threads, so consecutive items are in different stages at the same
+    time (e.g. window 3 renders while window 2 is OCR'd and window 1 table-detected).
+    Torch and PyMuPDF release the GIL, so the models really do run concurrently.
+    An exception in a stage stops all stages and is re-raised here; closing the generator
+    early stops them too. `overlap=False` runs the stages one after the other in the
+    calling thread (same results, for debugging / profiling).
+    """
+    if not overlap:
+        for item in source:
+            for stage in stages:
+                item = stage.fn(item)
+            yield item
+        return
+
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    lock = threading.Lock()
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(len(stages) + 1)]
+    running = [max(1, s.threads) for s in stages]
+
+    def put(q: queue.Queue, msg) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(msg, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fail(e: BaseException) -> None:
+        errors.append(e)
+        stop.set()
+
+    def feed() -> None:
+        try:
+            for seq, item in enumerate(source):
+                if not put(queues[0], (seq, item)):
+                    return
+        except BaseException as e:
+            fail(e)
+            return
+        for _ in range(running[0]):
+            put(queues[0], _DONE)
+
+    def work(i: int) -> None:
+        stage, src, dst = stages[i], queues[i], queues[i + 1]
+        try:
+            while not stop.is_set():
+                try:
+                    msg = src.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if msg is _DONE:
+                    break
+                seq, item = msg
+                if not put(dst, (seq, stage.fn(item))):
+                    return
+            else:
+                return
+        except BaseException as e:
+            fail(e)
+            return
+        # the last thread of a stage to finish closes the next one
+        with lock:
+            running[i] -= 1
+            last = running[i] == 0
+        if last:
+            for _ in range(running[i + 1] if i + 1 < len(stages) else 1):
+                put(dst, _DONE)
+
+    threads = [threading.Thread(target=feed, name="stage-feed", daemon=True)]
+    for i, stage in enumerate(stages):
+        threads += [threading.Thread(target=work, args=(i,), name=f"stage-{stage.name}-{k}", daemon=True)
+                    for k in range(running[i])]
+    for t in threads:
+        t.start()
+
+    pending = {}
+    next_seq = 0
+    try:
+        while True:
+            if errors:
+                raise errors[0]
+            try:
+                msg = queues[-1].get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if msg is _DONE:
+                break
+            seq, out = msg
+            pending[seq] = out
+            # stages with several threads can finish items out of order
+            while next_seq in pending:
+                yield pending.pop(next_seq)
+                next_seq += 1
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
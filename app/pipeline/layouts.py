@@ -0,0 +1,175 @@
+# app/pipeline/layouts.py
+"""
+Layout store: table grids of pages that parsed well, keyed by the page's header words,
+so the next report from the same accounting template skips the structure model.
+
+A stored grid is only reused after checking it against the new page's tokens: the
+anchor words must sit where they did (up to a common shift), every token inside a
+table must fall in a cell, no body row may hold two lines of text, the same cells must be
+filled and no new text may appear just above or below a table.
+"""
+import hashlib
+import json
+import re
+from typing import List, Optional, Tuple
+import numpy as np
+from app.ir.schema import PageIR, TableBlock
+from app.pipeline.cache import _dir, _evict, _read, _write
+import settings
+
+KIND = "layouts"
+LAYOUT_VERSION = "1"  # bump when the stored entry format changes
+RE_WORD = re.compile(r"^[^\d]*[A-Za-zÀ-ÿ]{2,}[^\d]*$")  # label-like: letters, no digits
+MIN_ANCHORS = 6
+ANCHOR_TOL = 0.005  # anchor / grid position tolerance, fraction of page size
+MIN_ANCHOR_HITS = 0.9
+MIN_TOKENS_IN_CELLS = 0.98
+MIN_SAME_CELLS = 0.85  # amounts come and go between years, the labels don't
+EDGE_ROWS = 3  # rows of margin above / below a table checked for new text
+
+def _anchors(page: PageIR) -> List[int]:
+    """Indices of the first label-like tokens in reading order (the template's header words)."""
+    tokens = page.tokens
+    if not len(tokens):
+        return []
+    order = np.lexsort((tokens.x0, np.round(tokens.y0 / max(1.0, float(np.median(tokens.y1 - tokens.y0))))))
+    words = [i for i in order.tolist() if RE_WORD.match(tokens.text[i])]
+    return words[:settings.LAYOUT_ANCHORS]
+
+def _key(page: PageIR, anchors: List[int]) -> str:
+    """
+    Template key. Entries carry the column roles the parser chose, so they are also keyed
+    by PIPELINE_VERSION: after a heuristics change, known templates are parsed afresh.
+    The grid comes from the structure model, so the models' fingerprint (weights
+    revision included) is part of the key too.
+    """
+    from app.pipeline.pipeline import PIPELINE_VERSION, _ml_fingerprint  # pipeline imports this module
+    texts = [page.tokens.text[i].lower() for i in anchors]
+    data = json.dumps([LAYOUT_VERSION, PIPELINE_VERSION, _ml_fingerprint(), round(page.width / page.height, 2),
+                       texts], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def _norm_centers(page: PageIR, idx=None) -> Tuple[np.ndarray, np.ndarray]:
+    cx, cy = page.tokens.centers()
+    if idx is not None:
+        cx, cy = cx[idx], cy[idx]
+    return cx / page.width, cy / page.height
+
+def _cell_of(tb: TableBlock, cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+    """Index into tb.cells of the cell holding each point, -1 if none."""
+    out = np.full(len(cx), -1)
+    for k, cell in enumerate(tb.cells):
+        x0, y0, x1, y1 = cell.bbox
+        out[(out < 0) & (x0 <= cx) & (cx <= x1) & (y0 <= cy) & (cy <= y1)] = k
+    return out
+
+def _table_profile(page: PageIR, tb: TableBlock) -> Optional[dict]:
+    """
+    What a matching page must reproduce for this table (page px): the filled cells and
+    the number of tokens in the margins above / below it. None if the grid doesn't fit
+    its own tokens (then it isn't worth storing).
+    """
+    tokens = page.tokens
+    cx, cy = tokens.centers()
+    x0, y0, x1, y1 = tb.bbox
+    inside = (x0 <= cx) & (cx <= x1) & (y0 <= cy) & (cy <= y1)
+    cells = _cell_of(tb, cx[inside], cy[inside])
+    if not inside.any() or (cells >= 0).mean() < MIN_TOKENS_IN_CELLS:
+        return None
+    margin = EDGE_ROWS * (y1 - y0) / max(1, tb.n_rows)
+    cols = (x0 <= cx) & (cx <= x1)
+    return {
+        "filled": sorted(set(cells[cells >= 0].tolist())),
+        "above": int((cols & (y0 - margin <= cy) & (cy < y0)).sum()),
+        "below": int((cols & (y1 < cy) & (cy <= y1 + margin)).sum()),
+    }
+
+def _fits(page: PageIR, tb: TableBlock, profile: dict) -> bool:
+    tokens = page.tokens
+    cx, cy = tokens.centers()
+    x0, y0, x1, y1 = tb.bbox
+    inside = (x0 <= cx) & (cx <= x1) & (y0 <= cy) & (cy <= y1)
+    if not inside.any():
+        return False
+    cells = _cell_of(tb, cx[inside], cy[inside])
+    if (cells >= 0).mean() < MIN_TOKENS_IN_CELLS:
+        return False
+    # one line of text per body row: a row holding two lines means rows were added / moved
+    # (the header row may wrap, e.g. "Saldo / 31-12-2023")
+    heights = (tokens.y1 - tokens.y0)[inside]
+    line = 0.75 * float(np.median(heights))
+    rows = np.array([tb.cells[k].row for k in cells[cells >= 0]])
+    ys = cy[inside][cells >= 0]
+    for r in np.unique(rows[rows > 0]):
+        r_ys = ys[rows == r]
+        if r_ys.max() - r_ys.min() > line:
+            return False
+    filled, stored = set(cells[cells >= 0].tolist()), set(profile["filled"])
+    if len(filled & stored) < MIN_SAME_CELLS * len(filled | stored):
+        return False
+    margin = EDGE_ROWS * (y1 - y0) / max(1, tb.n_rows)
+    cols = (x0 <= cx) & (cx <= x1)
+    above = int((cols & (y0 - margin <= cy) & (cy < y0)).sum())
+    below = int((cols & (y1 < cy) & (cy <= y1 + margin)).sum())
+    return above <= profile["above"] and below <= profile["below"]
+
+def _place(tb: dict, page: PageIR, dx: float, dy: float) -> TableBlock:
+    """Stored (normalized) table -> TableBlock in this page's px, shifted by (dx, dy)."""
+    def box(b):
+        return ((b[0] + dx) * page.width, (b[1] + dy) * page.height,
+                (b[2] + dx) * page.width, (b[3] + dy) * page.height)
+    return TableBlock.model_validate({
+        **tb, "page": page.page, "bbox": box(tb["bbox"]),
+        "cells": [{**c, "page": page.page, "bbox": box(c["bbox"]), "text": ""} for c in tb["cells"]],
+    })
+
+def _normalized(tb: TableBlock, page: PageIR) -> dict:
+    def box(b):
+        return (b[0] / page.width, b[1] / page.height, b[2] / page.width, b[3] / page.height)
+    data = tb.model_dump(mode="json")
+    data["bbox"] = box(tb.bbox)
+    for c, cell in zip(data["cells"], tb.cells):
+        c["bbox"] = box(cell.bbox)
+        c["text"] = ""
+    return data
+
+def match(page: PageIR) -> Optional[List[TableBlock]]:
+    """Tables of a stored layout that fit this page (new TableBlocks, no text), else None."""
+    anchors = _anchors(page)
+    if len(anchors) < MIN_ANCHORS:
+        return None
+    key = _key(page, anchors)
+    entry = _read(KIND, key)
+    if entry is None:
+        return None
+    try:
+        if len(entry["anchors"]) != len(anchors):
+            return None
+        cx, cy = _norm_centers(page, anchors)
+        d = np.column_stack([cx, cy]) - np.asarray(entry["anchors"], dtype=np.float64)
+        shift = np.median(d, axis=0)
+        if (np.abs(d - shift).max(axis=1) <= ANCHOR_TOL).mean() < MIN_ANCHOR_HITS:
+            return None
+        tables = [_place(tb, page, *shift) for tb in entry["tables"]]
+        fits = all(_fits(page, tb, prof) for tb, prof in zip(tables, entry["profiles"], strict=True))
+    except (KeyError, TypeError, ValueError, IndexError) as e:  # ValidationError is a ValueError
+        print(f"[layouts] dropping invalid entry {key}: {e!r}")
+        (_dir(KIND) / f"{key}.json").unlink(missing_ok=True)
+        return None
+    return tables if fits else None
+
+def remember(page: PageIR) -> None:
+    """Store the page's table grids (with their parsed column roles) under its layout key."""
+    anchors = _anchors(page)
+    if len(anchors) < MIN_ANCHORS or not page.tables:
+        return
+    profiles = [_table_profile(page, tb) for tb in page.tables]
+    if any(p is None for p in profiles):
+        return
+    cx, cy = _norm_centers(page, anchors)
+    _write(KIND, _key(page, anchors), {
+        "anchors": np.column_stack([cx, cy]).tolist(),
+        "tables": [_normalized(tb, page) for tb in page.tables],
+        "profiles": profiles,
+    })
+    _evict(_dir(KIND), settings.LAYOUT_STORE_MAX_MB * 1024 * 1024)
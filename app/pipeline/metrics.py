@@ -0,0 +1,84 @@
+# app/pipeline/metrics.py
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+class StageTimer:
+    """Wall time per pipeline stage, summed over repeated calls."""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - t0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.totals[name] += seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {k: round(v, 4) for k, v in self.totals.items()}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Metrics:
+    """
+    Process-wide counters and summaries (sum + count), rendered in the Prometheus
+    text exposition format by /metrics.
+    """
+
+    def __init__(self, prefix: str = "extract"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._sums: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._counts: Dict[str, Dict[Labels, int]] = defaultdict(lambda: defaultdict(int))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self._counters[name][tuple(sorted(labels.items()))] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._sums[name][key] += value
+            self._counts[name][key] += 1
+
+    def record_result(self, diagnostics: dict) -> None:
+        """Fold one document's diagnostics (see iter_pipeline) into the metrics."""
+        self.inc("documents_total", cache=str(diagnostics.get("cache", "off")))
+        self.inc("pages_total", diagnostics.get("n_pages", 0))
+        self.inc("pages_skipped_total", len(diagnostics.get("skipped_pages", {})))
+        self.inc("page_cache_hits_total", len(diagnostics.get("page_cache_hits", [])))
+        self.inc("items_total", diagnostics.get("n_items", 0))
+        for stage, seconds in diagnostics.get("timings", {}).items():
+            self.observe("stage_seconds", seconds, stage=stage)
+
+    def render(self, gauges: Dict[str, float] | None = None) -> str:
+        def fmt(labels: Labels) -> str:
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} counter")
+                lines += [f"{self.prefix}_{name}{fmt(l)} {v}" for l, v in sorted(series.items())]
+            for name, series in sorted(self._sums.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} summary")
+                for l, v in sorted(series.items()):
+                    lines.append(f"{self.prefix}_{name}_sum{fmt(l)} {v:.6f}")
+                    lines.append(f"{self.prefix}_{name}_count{fmt(l)} {self._counts[name][l]}")
+        for name, v in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            lines.append(f"{self.prefix}_{name} {v}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
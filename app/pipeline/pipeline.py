@@ -1,26 +1,361 @@
 # app/pipeline/pipeline.py
+import time
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import fitz  # PyMuPDF
+import numpy as np
+from app.ir.schema import DocIR, PageIR
+from app.extractors import ocr_pytesseract
+from app.extractors.company import company_number
+from app.ml import ocr_doctr, hf_table_transformer
+from app.ml.backend import limit_torch_threads, package_version
 from app.ml.ocr_doctr import pdf_to_tokens_ir
 from app.ml.hf_table_transformer import add_hf_tables
-from app.parsers.hf_table_to_rows import tables_to_lineitems
-from app.io.schema import LineItem, ExtractionResult
+from app.parsers.hf_table_to_rows import assign_tokens, page_to_lineitems
+from app.io.schema import LineItem, ExtractionResult, PageResult
 from app.validators.accounting_rules import reconcile
+from app.pipeline.render import FITZ_LOCK, page_size, plan_windows, render_page, render_pages
+from app.pipeline.triage import triage_pages
+from app.pipeline import cache, layouts
+from app.pipeline.metrics import StageTimer
+from app.pipeline.executor import Stage, run_stages
+import settings
+
+# Bump when parsing / validation heuristics change, so cached results are not reused.
+# Cached pages stay valid, so only tables_to_lineitems / reconcile re-run.
+PIPELINE_VERSION = "4"
+
+COMPANY_PAGES = 3  # pages searched for the company's enterprise number
+
+def _company_number(pdf_path: Path, pages: List[PageIR]) -> str | None:
+    """Enterprise number from the first pages' text layer, or their OCR tokens for scans."""
+    texts = [" ".join(p.tokens.text) for p in pages[:COMPANY_PAGES]]
+    with FITZ_LOCK, fitz.open(str(pdf_path)) as doc:
+        texts += [doc[i].get_text() for i in range(min(COMPANY_PAGES, len(doc)))]
+    return company_number(texts)
+
+def load_models(torch_threads: int = 0) -> Dict[str, float]:
+    """
+    Load docTR and the Table Transformer now instead of on first use (worker startup).
+    `torch_threads` caps the cores this process's models use (0 = all, see
+    limit_torch_threads), so parallel workers don't oversubscribe.
+    Returns the load time in seconds per model.
+    """
+    limit_torch_threads(torch_threads)
+    timer = StageTimer()
+    with timer.stage("doctr"):
+        ocr_doctr._get_model()
+    with timer.stage("table_transformer"):
+        hf_table_transformer._load_model()
+    return timer.as_dict()
+
+# header + account rows, so warm-up goes through text detection and recognition too
+WARMUP_ROWS = [("Rekening", "Omschrijving", "2023", "2022")] + [
+    (str(600000 + 100 * i), "Omzet", "1.234,56", "(987,00)") for i in range(8)
+]
+
+def _warmup_page():
+    """A synthetic A4 balance-sheet page rendered at RENDER_DPI."""
+    with fitz.open() as doc:
+        page = doc.new_page()
+        for r, row in enumerate(WARMUP_ROWS):
+            for c, text in enumerate(row):
+                page.insert_text((72 + 120 * c, 100 + 20 * r), text, fontsize=10)
+        return render_page(page, settings.RENDER_DPI)
+
+def warm_up() -> Dict[str, float]:
+    """
+    One dummy inference per model on a synthetic page, so the first real request doesn't
+    pay for lazy initialisation (kernel selection, allocator growth). Loads the models
+    first if needed. Returns the warm-up time in seconds per model.
+    """
+    img = _warmup_page()
+    timer = StageTimer()
+    with timer.stage("doctr"):
+        ocr_doctr._get_model()([img])
+    with timer.stage("table_transformer"):
+        hf_table_transformer._load_model()
+        if settings.TABLE_STRUCTURE_MODE == "crop":
+            hf_table_transformer._predict_crops(DocIR(pages=[
+                PageIR(page=0, width=img.shape[1], height=img.shape[0], tokens=[], tables=[])
+            ]), {0: img})
+        else:
+            hf_table_transformer._predict_all([img], 1)
+    return timer.as_dict()
+
+def _ml_fingerprint() -> dict:
+    """Everything besides the page content that determines tokens + table structure."""
+    fp = {
+        "ocr": [ocr_doctr.DET_ARCH, ocr_doctr.RECO_ARCH, package_version("python-doctr")],
+        # model id, weights revision (the cached hub snapshot) and transformers version
+        "tables": hf_table_transformer._source(hf_table_transformer.MODEL_NAME),
+        "backend": settings.INFERENCE_BACKEND,
+        "pymupdf": package_version("pymupdf"),
+        "render_dpi": settings.RENDER_DPI,
+        "use_text_layer": settings.USE_TEXT_LAYER,
+        "text_layer_min_words": settings.TEXT_LAYER_MIN_WORDS,
+    }
+    if settings.OCR_ENGINE != "doctr":  # keeps existing page-cache keys valid
+        fp["ocr_cascade"] = [settings.OCR_ENGINE, ocr_pytesseract.version(), settings.OCR_TESSERACT_LANG,
+                             settings.OCR_MIN_WORD_CONF, settings.OCR_ESCALATE_PAGE_FRAC]
+    if settings.TABLE_STRUCTURE_MODE != "page":
+        fp["table_crop"] = [settings.TABLE_STRUCTURE_MODE,
+                            *hf_table_transformer._source(hf_table_transformer.DETECTION_MODEL_NAME),
+                            settings.TABLE_LOCATE_MAX_PX, settings.TABLE_TEXT_PX, settings.TABLE_CROP_MAX_PX]
+    return fp
+
+def _fingerprint() -> dict:
+    """Everything besides the PDF bytes that determines the output of run_pipeline."""
+    return {
+        **_ml_fingerprint(),
+        "pipeline": PIPELINE_VERSION,
+        "triage": [settings.TRIAGE_PAGES, settings.TRIAGE_MIN_ACCOUNTS,
+                   settings.TRIAGE_MIN_AMOUNTS, settings.TRIAGE_MIN_LINES],
+        "layouts": [settings.USE_LAYOUT_STORE, settings.LAYOUT_ANCHORS],
+    }
+
+@dataclass
+class _Window:
+    """A window of pages on its way through the stages of iter_pipeline."""
+    idx: List[int]
+    timer: StageTimer = field(default_factory=StageTimer)
+    images: Dict[int, np.ndarray] = field(default_factory=dict)
+    keys: Dict[int, str] = field(default_factory=dict)
+    pages: Dict[int, PageIR] = field(default_factory=dict)
+    cached: List[int] = field(default_factory=list)
+    new: DocIR | None = None
+    results: Dict[int, Tuple[List[LineItem], Dict[str, float]]] = field(default_factory=dict)
+
+def _render_stage(w: _Window, pdf_path: Path, skipped: Dict[int, str], use_cache: bool) -> _Window:
+    """
+    Render the window's pages once (OCR and table detection share these images).
+    With the cache on, pages are keyed by their rendered pixels and pages seen before
+    come from the page cache, so only unseen pages go through the models.
+    """
+    with w.timer.stage("render"):
+        w.images = render_pages(pdf_path, settings.RENDER_DPI, [i for i in w.idx if i not in skipped])
+    if use_cache:
+        with w.timer.stage("page_cache"):
+            fp = _ml_fingerprint()
+            w.keys = {i: cache.make_key(img, fp) for i, img in w.images.items()}
+            for i, key in w.keys.items():
+                page = cache.load_page(key, i)
+                if page is not None:
+                    w.pages[i] = page
+        w.cached = sorted(w.pages)
+    return w
+
+def _ocr_stage(w: _Window, pdf_path: Path) -> _Window:
+    """
+    Tokens (PDF text layer where present, OCR otherwise) for the uncached pages.
+    "ocr" is the stage's total; "ocr_tesseract" / "ocr_doctr" the part spent per engine.
+    """
+    todo = [i for i in sorted(w.images) if i not in w.pages]
+    if todo:
+        with w.timer.stage("ocr"):
+            w.new = pdf_to_tokens_ir(pdf_path, w.images, pages=todo, timer=w.timer)
+    return w
+
+def _tables_stage(w: _Window, pdf_path: Path, use_cache: bool) -> _Window:
+    """
+    Table structure and cell grid for the OCR'd pages; the images are released here.
+    Pages matching a stored layout reuse its grid instead of running the model.
+    """
+    if w.new is not None:
+        todo = w.new.pages
+        if use_cache and settings.USE_LAYOUT_STORE:
+            with w.timer.stage("layouts"):
+                todo = []
+                for p in w.new.pages:
+                    tables = layouts.match(p)
+                    if tables is None:
+                        todo.append(p)
+                    else:
+                        p.tables, p.table_source = tables, "layout"
+        if todo:
+            with w.timer.stage("tables"):
+                add_hf_tables(DocIR(pages=todo), pdf_path, w.images)
+        if use_cache:
+            try:
+                with w.timer.stage("page_cache"):
+                    cache.store_pages({w.keys[p.page]: p for p in w.new.pages})
+            except OSError as e:
+                print(f"[cache] page store failed: {e}")
+        for p in w.new.pages:
+            w.pages[p.page] = p
+        w.new = None
+    w.images = {}
+    return w
+
+def _parse_stage(w: _Window, use_cache: bool) -> _Window:
+    """
+    Fill cells from tokens, convert tables → LineItems (heuristics for acc/name/amount/year).
+    Each page's timings get an even share of the window's render / OCR / table time.
+    Model-built grids that yield line items are remembered in the layout store.
+    """
+    share = {k: v / max(1, len(w.pages)) for k, v in w.timer.totals.items()}
+    for i, page in sorted(w.pages.items()):
+        page_timer = StageTimer()
+        for k, v in share.items():
+            page_timer.add(k, v)
+        with page_timer.stage("assign"):
+            assign_tokens(page)
+        with page_timer.stage("parse"):
+            page_items = page_to_lineitems(page)
+        if use_cache and settings.USE_LAYOUT_STORE and page_items and page.table_source == "model":
+            try:
+                with page_timer.stage("layout_store"):
+                    layouts.remember(page)
+            except OSError as e:
+                print(f"[layouts] store failed: {e}")
+        w.results[i] = (page_items, page_timer.as_dict())
+    return w
+
+def _page_result(page: PageIR, items: List[LineItem], from_cache: bool,
+                 skip_reason: str | None = None, timings: Dict[str, float] | None = None) -> PageResult:
+    warnings = []
+    if page.tables and not items:
+        warnings.append(f"Page {page.page}: {len(page.tables)} table(s) detected but no line items parsed.")
+    diagnostics = {
+        "token_source": page.token_source,
+        "table_source": page.table_source,
+        "n_tables": len(page.tables),
+        "n_items": len(items),
+        "cached": from_cache,
+    }
+    if skip_reason:
+        diagnostics["skipped"] = skip_reason
+    if timings is not None:
+        diagnostics["timings"] = timings
+    return PageResult(page=page.page, items=items, warnings=warnings, diagnostics=diagnostics)
+
+def _replay(ir: DocIR, result: ExtractionResult, timer: StageTimer) -> Iterator[PageResult | ExtractionResult]:
+    """Per-page results of a cached document, in the same shape as a fresh run."""
+    by_page: Dict[int, List[LineItem]] = {}
+    for item in result.items:
+        by_page.setdefault(item.source_page, []).append(item)
+    for page in ir.pages:
+        yield _page_result(page, by_page.get(page.page, []), True)
+    result.diagnostics["cache"] = "hit"
+    result.diagnostics["timings"] = timer.as_dict()
+    yield result
+
+def iter_pipeline(pdf_path: Path, use_cache: bool | None = None,
+                  window: int | None = None) -> Iterator[PageResult | ExtractionResult]:
+    """
+    Run the pipeline page by page: yields a PageResult for every page as soon as it has
+    been through OCR, table detection and parsing, then the final ExtractionResult.
+    Pages go through the models in windows of at most `window` pages (default
+    settings.PAGE_WINDOW_PAGES, 0 = no page limit) and settings.PAGE_WINDOW_MAX_MB of
+    rendered images; each window's images are dropped before the next one is rendered.
+    Whole results and per-page tokens/tables are cached on disk by content
+    (see app.pipeline.cache); `use_cache=False` bypasses both.
+    The stages run in their own threads (see app.pipeline.executor), so one window is
+    rendered while the previous one is OCR'd and the one before that table-detected.
+    Time per stage is reported in diagnostics["timings"], per document and per page
+    (render / OCR / table time of a window is shared evenly by its pages); stages overlap,
+    so their sum can exceed "total".
+    """
+    t_start = time.perf_counter()
+    timer = StageTimer()
+    if use_cache is None:
+        use_cache = settings.USE_RESULT_CACHE
+    key = None
+    if use_cache:
+        with timer.stage("result_cache"):
+            key = cache.file_key(Path(pdf_path), _fingerprint())
+            hit = cache.load(key)
+        if hit is not None:
+            timer.add("total", time.perf_counter() - t_start)
+            yield from _replay(*hit, timer)
+            return
+
+    # Triage: pages that can't hold a table skip OCR and table detection entirely
+    with timer.stage("triage"), fitz.open(str(pdf_path)) as doc:
+        skipped = triage_pages(doc) if settings.TRIAGE_PAGES else {}
+        skipped_ir = {
+            i: PageIR(page=i, width=w, height=h, tokens=[], tables=[], token_source="skipped")
+            for i in skipped for w, h in [page_size(doc[i], settings.RENDER_DPI)]
+        }
+        if window is None:
+            window = settings.PAGE_WINDOW_PAGES
+        windows = plan_windows(doc, settings.RENDER_DPI, window, settings.PAGE_WINDOW_MAX_MB, skipped)
+
+    # 0) render → 1) tokens → 2) table structure → 3) parse, overlapped across windows;
+    # OCR and tables share the process's torch threads (unless load_models capped them)
+    limit_torch_threads()
+    stages = [
+        Stage("render", partial(_render_stage, pdf_path=pdf_path, skipped=skipped, use_cache=use_cache),
+              settings.PIPELINE_RENDER_THREADS),
+        Stage("ocr", partial(_ocr_stage, pdf_path=pdf_path), settings.PIPELINE_OCR_THREADS),
+        Stage("tables", partial(_tables_stage, pdf_path=pdf_path, use_cache=use_cache),
+              settings.PIPELINE_TABLE_THREADS),
+        Stage("parse", partial(_parse_stage, use_cache=use_cache), settings.PIPELINE_PARSE_THREADS),
+    ]
+    pages: List[PageIR] = []
+    items: List[LineItem] = []
+    cached_pages: List[int] = []
+    for w in run_stages((_Window(idx) for idx in windows), stages,
+                        settings.PIPELINE_QUEUE_SIZE, settings.PIPELINE_OVERLAP):
+        cached_pages += w.cached
+        for k, v in w.timer.totals.items():
+            timer.add(k, v)
+        for i in w.idx:
+            if i in skipped:
+                pages.append(skipped_ir[i])
+                yield _page_result(skipped_ir[i], [], False, skipped[i])
+                continue
+            page = w.pages[i]
+            page_items, page_timings = w.results[i]
+            timer.add("assign", page_timings["assign"])
+            timer.add("parse", page_timings["parse"])
+            if "layout_store" in page_timings:
+                timer.add("layout_store", page_timings["layout_store"])
+            pages.append(page)
+            items += page_items
+            yield _page_result(page, page_items, i in w.cached, timings=page_timings)
 
-def run_pipeline(pdf_path: Path) -> ExtractionResult:
-    # 1) OCR tokens for all pages
-    ir = pdf_to_tokens_ir(pdf_path)
-    # 2) Detect table structure and build cell grid
-    ir = add_hf_tables(ir, pdf_path)
-    # 3) Convert tables → LineItems (heuristics for acc/name/amount/year)
-    items = tables_to_lineitems(ir)
     # 4) Validate & return
-    warnings = reconcile(items)
-    return ExtractionResult(
+    ir = DocIR(pages=pages)
+    with timer.stage("reconcile"):
+        warnings = reconcile(items)
+        company = _company_number(pdf_path, pages)
+    result = ExtractionResult(
         items=items,
         warnings=warnings,
         diagnostics={
             "flow": "huggingface+doctr",
             "n_pages": len(ir.pages),
+            "render_dpi": settings.RENDER_DPI,
             "n_items": len(items),
+            "company_number": company,
+            "text_layer_pages": [p.page for p in ir.pages if p.token_source == "text_layer"],
+            "ocr_pages": [p.page for p in ir.pages if p.token_source == "doctr"],
+            "tesseract_pages": [p.page for p in ir.pages if p.token_source == "tesseract"],
+            "escalated_region_pages": [p.page for p in ir.pages if p.token_source == "tesseract+doctr"],
+            "page_cache_hits": cached_pages,
+            "layout_pages": [p.page for p in ir.pages if p.table_source == "layout"],
+            "skipped_pages": skipped,
         }
     )
+    if key is not None:
+        try:
+            with timer.stage("result_cache"):
+                cache.store(key, ir, result)
+        except OSError as e:
+            print(f"[cache] store failed: {e}")
+    result.diagnostics["cache"] = "miss" if key is not None else "off"
+    timer.add("total", time.perf_counter() - t_start)
+    result.diagnostics["timings"] = timer.as_dict()
+    yield result
+
+def run_pipeline(pdf_path: Path, use_cache: bool | None = None) -> ExtractionResult:
+    """
+    Extract line items from a PDF (see iter_pipeline). Whole results and per-page
+    tokens/tables are cached on disk by content; `use_cache=False` bypasses both.
+    """
+    for out in iter_pipeline(pdf_path, use_cache):
+        pass
+    return out
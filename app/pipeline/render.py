@@ -0,0 +1,52 @@
+# app/pipeline/render.py
+import threading
+from pathlib import Path
+from typing import Collection, Dict, List, Optional, Tuple
+import fitz  # PyMuPDF
+import numpy as np
+
+# PyMuPDF is not thread-safe: pipeline stages hold this around their use of fitz documents
+FITZ_LOCK = threading.RLock()
+
+def render_page(page: fitz.Page, dpi: int) -> np.ndarray:
+    """
+    Rasterize one page to an RGB uint8 array (h, w, 3) at `dpi`.
+    The array is a read-only view on the sample bytes, so it can be shared without copying.
+    """
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+
+def page_size(page: fitz.Page, dpi: int) -> Tuple[int, int]:
+    """(width, height) in pixels of the page rendered at `dpi`, without rendering it."""
+    size = (page.rect * page.rotation_matrix * fitz.Matrix(dpi / 72.0, dpi / 72.0)).irect
+    return size.width, size.height
+
+def render_pages(pdf_path: Path, dpi: int, pages: Optional[List[int]] = None) -> Dict[int, np.ndarray]:
+    """Render the given pages (default: all) once; returns page index -> image."""
+    with FITZ_LOCK, fitz.open(str(pdf_path)) as doc:
+        idx = range(len(doc)) if pages is None else pages
+        return {i: render_page(doc[i], dpi) for i in idx}
+
+def plan_windows(doc: fitz.Document, dpi: int, max_pages: int, max_mb: float,
+                 skip: Optional[Collection[int]] = None) -> List[List[int]]:
+    """
+    Split the document's pages into consecutive windows of at most `max_pages` pages
+    (0 = no limit) whose rendered images together stay within `max_mb` (0 = no limit).
+    A page larger than the budget gets a window of its own. Pages in `skip` are not
+    rendered, so they only count towards `max_pages`.
+    """
+    budget = max_mb * 1024 * 1024
+    windows: List[List[int]] = []
+    cur: List[int] = []
+    used = 0
+    for i in range(len(doc)):
+        w, h = (0, 0) if skip and i in skip else page_size(doc[i], dpi)
+        size = w * h * 3
+        if cur and ((max_pages and len(cur) >= max_pages) or (budget and used + size > budget)):
+            windows.append(cur)
+            cur, used = [], 0
+        cur.append(i)
+        used += size
+    if cur:
+        windows.append(cur)
+    return windows
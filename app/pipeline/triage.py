@@ -0,0 +1,44 @@
+# app/pipeline/triage.py
+import re
+from typing import Dict, List, Optional
+import fitz  # PyMuPDF
+import numpy as np
+from app.parsers.hf_table_to_rows import RE_ACC
+import settings
+
+# Belgian/European amounts as they appear in the text layer: 1.234,56 / (12 345) / -500,
+# and without thousands separators: 1234,56 / 987,00
+RE_AMOUNT = re.compile(r"^[-–(]?(?:\d{1,3}(?:[.\s ]\d{3})*(?:,\d{1,2})?|\d+,\d{2})\)?$")
+
+def _text_layer_reason(words: List[str]) -> Optional[str]:
+    """Skip reason for a born-digital page, None if it may hold a table."""
+    n_acc = sum(bool(RE_ACC.match(w)) for w in words)
+    n_amt = sum(bool(RE_AMOUNT.match(w)) for w in words)
+    if n_acc >= settings.TRIAGE_MIN_ACCOUNTS or n_amt >= settings.TRIAGE_MIN_AMOUNTS:
+        return None
+    return f"text layer: {n_acc} account numbers, {n_amt} amounts"
+
+def _image_reason(page: fitz.Page) -> Optional[str]:
+    """Skip reason for a scanned page from a tiny grayscale render: too few lines of ink."""
+    pix = page.get_pixmap(dpi=36, colorspace=fitz.csGRAY, alpha=False)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+    inked = (img < 160).mean(axis=1) > 0.01  # rows with some ink
+    # a text line / table row is a run of inked rows; count run starts
+    n_lines = int(inked[0]) + int(np.count_nonzero(inked[1:] & ~inked[:-1]))
+    if n_lines >= settings.TRIAGE_MIN_LINES:
+        return None
+    return f"image: {n_lines} lines of ink"
+
+def triage_pages(doc: fitz.Document) -> Dict[int, str]:
+    """
+    Cheap pre-filter before OCR and table detection: page index -> reason, for pages that
+    can't hold a balance-sheet table (cover pages, legal text, blank pages).
+    """
+    skipped: Dict[int, str] = {}
+    for p_idx, page in enumerate(doc):
+        words = [w[4] for w in page.get_text("words")]
+        # scanned / too little text: decide from the image
+        reason = _text_layer_reason(words) if len(words) >= settings.TEXT_LAYER_MIN_WORDS else _image_reason(page)
+        if reason:
+            skipped[p_idx] = reason
+    return skipped
@@ -1,7 +1,59 @@
 # app/validators/accounting_rules.py
+from collections import defaultdict
+
+# Rollups follow the chart of accounts: totals are a class, group or subgroup (1-3 digits),
+# accounts have LEDGER_DIGITS digits or more. Codes in between, like the boxes of the tax
+# forms (1058, 8310), are neither and are left out.
+MAX_TOTAL_DIGITS = 3
+LEDGER_DIGITS = 6
+
+def chart_account(acc: str) -> bool:
+    """Whether `acc` is a total or a ledger account of the chart of accounts."""
+    return acc.isdigit() and (len(acc) <= MAX_TOTAL_DIGITS or len(acc) >= LEDGER_DIGITS)
+
+def _rollups(amounts):
+    """
+    Totals ({account: amount} of one year) that don't match the sum of the leaf accounts
+    under them; the per-document version of consolidation's rollup check.
+    """
+    numeric = {acc: amount for acc, amount in amounts.items() if chart_account(acc)}
+    under = defaultdict(list)
+    for acc in numeric:
+        for n in range(1, min(len(acc), MAX_TOTAL_DIGITS + 1)):
+            if acc[:n] in numeric:
+                under[acc[:n]].append(acc)
+    off = 0
+    for total, below in under.items():
+        leaves = [acc for acc in below if acc not in under]
+        if leaves and sum(numeric[acc] for acc in leaves) != numeric[total]:
+            off += 1
+    return off
+
 def reconcile(items):
-    """Basic sanity checks."""
+    """
+    Basic sanity checks, plus the same account/year with different amounts and totals
+    that don't add up within this document. Checks across documents (years, companies)
+    are left to app.validators.consolidation.
+    """
     warnings = []
     if not items:
         warnings.append("No items extracted.")
+        return warnings
+    seen = defaultdict(set)
+    best = {}  # (account, year) -> the most confident item
+    for item in items:
+        key = (item.rekeningnummer, item.fiscal_year)
+        seen[key].add(item.amount)
+        if key not in best or (item.confidence or 0) > (best[key].confidence or 0):
+            best[key] = item
+    conflicts = {key for key, amounts in seen.items() if len(amounts) > 1}
+    if conflicts:
+        n_items = sum(1 for item in items if (item.rekeningnummer, item.fiscal_year) in conflicts)
+        warnings.append(f"{len(conflicts)} account/year amount(s) differ between items ({n_items} items).")
+    years = defaultdict(dict)
+    for (acc, year), item in best.items():
+        years[year][acc] = item.amount
+    off = sum(_rollups(amounts) for amounts in years.values())
+    if off:
+        warnings.append(f"{off} total(s) don't match the sum of their accounts.")
     return warnings
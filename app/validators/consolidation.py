@@ -0,0 +1,244 @@
+# app/validators/consolidation.py
+"""
+Cross-document consolidation of line items in the long layout (app.io.export.LONG_SCHEMA),
+e.g. the 2022 and 2023 reports of a company, which share the comparative year:
+
+- one amount per company / rekeningnummer / fiscal_year (the latest document wins),
+- conflicts: the same company, account and year with different amounts,
+- rollups: extracted totals (an account number that prefixes other accounts, e.g. "60"
+  or class "6") checked against the sum of the accounts under them; codes that aren't
+  accounts of the chart (tax form boxes, see accounting_rules.chart_account) are skipped,
+- class totals per company and year (Belgian chart of accounts, ACCOUNT_CLASSES).
+
+Amounts are compared as exact integers (millionths) and everything is done column-wise
+with hash group-bys / joins, so a whole archive (hundreds of thousands of items, e.g.
+read with load_dataset) is checked in seconds.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from app.io.export import AMOUNT_TYPE, LONG_SCHEMA, to_arrow_long
+from app.io.schema import LineItem
+from app.validators.accounting_rules import MAX_TOTAL_DIGITS, chart_account
+
+# Belgian minimum chart of accounts (MAR / PCMN), first digit of the account number
+ACCOUNT_CLASSES = {
+    "0": "Rechten en verplichtingen buiten balans",
+    "1": "Eigen vermogen, voorzieningen en schulden op meer dan één jaar",
+    "2": "Oprichtingskosten, vaste activa en vorderingen op meer dan één jaar",
+    "3": "Voorraden en bestellingen in uitvoering",
+    "4": "Vorderingen en schulden op ten hoogste één jaar",
+    "5": "Geldbeleggingen en liquide middelen",
+    "6": "Kosten",
+    "7": "Opbrengsten",
+}
+
+KEYS = ["company", "rekeningnummer", "fiscal_year"]
+SCOPE = ["company", "fiscal_year"]
+UNIT = 10 ** 6  # AMOUNT_TYPE has 6 decimal places
+
+@dataclass
+class Consolidation:
+    consolidated: pa.Table  # one row per KEYS: amount, its document / page, n_documents, conflict
+    conflicts: pa.Table     # every item of a conflicting KEYS group, with the consolidated amount
+    rollups: pa.Table       # extracted totals vs the sum of their accounts, mismatches only
+    class_totals: pa.Table  # sum per company / fiscal_year / account class
+    warnings: List[str] = field(default_factory=list)
+
+def from_documents(docs: Mapping[str, Sequence[LineItem]],
+                   companies: Optional[Mapping[str, str]] = None) -> pa.Table:
+    """
+    Long table of several documents' items ({document: items}). `companies` maps a
+    document to its company; by default each document is its own company.
+    """
+    companies = companies or {}
+    tables = [to_arrow_long(items, doc, companies.get(doc)) for doc, items in docs.items()]
+    return pa.concat_tables(tables) if tables else LONG_SCHEMA.empty_table()
+
+def load_dataset(base_dir: Path) -> pa.Table:
+    """A dataset written by app.io.export.append_dataset, back in LONG_SCHEMA."""
+    table = ds.dataset(base_dir, format="parquet", partitioning="hive").to_table()
+    return table.select(LONG_SCHEMA.names).cast(LONG_SCHEMA)
+
+def _units(amount: pa.ChunkedArray) -> np.ndarray:
+    """Exact amounts as int64 millionths."""
+    scaled = pc.multiply(amount.cast(pa.decimal128(24, 6)), pa.scalar(Decimal(UNIT), pa.decimal128(7, 0)))
+    return pc.cast(scaled, pa.int64()).to_numpy(zero_copy_only=False)
+
+def _amounts(units: np.ndarray) -> pa.Array:
+    """int64 millionths -> AMOUNT_TYPE, whose storage is the 128-bit unscaled integer."""
+    units = np.asarray(units, dtype=np.int64)
+    words = np.column_stack([units, units >> 63])  # little-endian low word, sign-extended high word
+    return pa.Array.from_buffers(AMOUNT_TYPE, len(units), [None, pa.py_buffer(np.ascontiguousarray(words))])
+
+def _encode(column: pa.ChunkedArray) -> Tuple[np.ndarray, np.ndarray]:
+    """Dictionary codes (int) of a string column and the dictionary (object array)."""
+    enc = pc.dictionary_encode(column.combine_chunks())
+    return enc.indices.to_numpy(zero_copy_only=False), np.array(enc.dictionary.to_pylist(), dtype=object)
+
+def _frame(long: pa.Table) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    One int column per key (dictionary codes) plus the amount in millionths; `row` indexes
+    `long`. Also returns the company and account dictionaries.
+    """
+    company, companies = _encode(long["company"])
+    document, _ = _encode(long["document"])
+    account, accounts = _encode(long["rekeningnummer"])
+    df = pd.DataFrame({
+        "row": np.arange(long.num_rows),
+        "company": company,
+        "document": document,
+        "rekeningnummer": account,
+        "fiscal_year": long["fiscal_year"].to_numpy(zero_copy_only=False),
+        "confidence": long["confidence"].fill_null(0.0).to_numpy(zero_copy_only=False),
+        "units": _units(long["amount"]),
+    })
+    # a document's own year is its latest; restated comparatives in later documents win
+    df["doc_year"] = df.groupby(["company", "document"])["fiscal_year"].transform("max")
+    return df, companies, accounts
+
+def _prefixes(accounts: np.ndarray) -> Tuple[np.ndarray, Dict[int, np.ndarray]]:
+    """
+    Per distinct account number: its length (0 if not an account of the chart) and, per
+    total length n, the code of its first n digits as an account of its own (-1 if none).
+    """
+    numeric = [a if chart_account(a) else "" for a in accounts.tolist()]
+    length = np.array([len(a) for a in numeric], dtype=np.int64)
+    code = {a: i for i, a in enumerate(numeric) if a}
+    heads = {n: np.array([code.get(a[:n], -1) if len(a) > n else -1 for a in numeric], dtype=np.int64)
+             for n in sorted(set(length.tolist()) - {0}) if n <= MAX_TOTAL_DIGITS}
+    return length, heads
+
+def _rollups(cons: pd.DataFrame, length: np.ndarray, heads: Dict[int, np.ndarray],
+             tolerance: int) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Totals are numeric accounts that prefix another account of the same company and
+    year; each is compared with the sum of the leaf accounts under it. Returns the totals
+    more than `tolerance` off, and which consolidated rows are totals.
+    """
+    acc_len = length[cons["rekeningnummer"].to_numpy()]
+    is_total = np.zeros(len(cons), dtype=bool)
+    under = {}
+    for n, head in heads.items():
+        longer = cons[acc_len > n]
+        under[n] = longer.assign(rekeningnummer=head[longer["rekeningnummer"].to_numpy()])
+        found = under[n].loc[under[n]["rekeningnummer"] >= 0, KEYS].drop_duplicates()
+        hit = cons.reset_index().merge(found, on=KEYS)["index"].to_numpy()
+        is_total[hit] = True
+    totals, out = cons[is_total], []
+    for n, below in under.items():
+        leaves = below[~is_total[below.index.to_numpy()] & (below["rekeningnummer"] >= 0)]
+        sums = leaves.groupby(KEYS).agg(accounts_units=("units", "sum"),
+                                        n_accounts=("units", "size")).reset_index()
+        out.append(totals[length[totals["rekeningnummer"].to_numpy()] == n].merge(sums, on=KEYS))
+    cols = ["row", "units", "accounts_units", "n_accounts"]
+    rolled = pd.concat(out, ignore_index=True) if out else pd.DataFrame(columns=cols, dtype="int64")
+    return rolled[(rolled["units"] - rolled["accounts_units"]).abs() > tolerance], is_total
+
+def _class_totals(cons: pd.DataFrame, accounts: np.ndarray, length: np.ndarray,
+                  is_total: np.ndarray) -> pd.DataFrame:
+    """Sum of the leaf accounts of the chart per company, year and account class (first digit)."""
+    first = np.array([a[:1] for a in accounts.tolist()], dtype=object)
+    acc = cons["rekeningnummer"].to_numpy()
+    leaves = cons[~is_total & (length[acc] > 0)]
+    return (leaves.assign(account_class=first[leaves["rekeningnummer"].to_numpy()])
+            .groupby(SCOPE + ["account_class"])
+            .agg(units=("units", "sum"), n_accounts=("units", "size")).reset_index())
+
+def _with(table: pa.Table, **columns: pa.Array) -> pa.Table:
+    for name, values in columns.items():
+        table = table.append_column(name, values)
+    return table
+
+def consolidate(long: pa.Table, tolerance: Decimal = Decimal("0")) -> Consolidation:
+    """
+    Join the items of many documents (LONG_SCHEMA rows, any number of companies) on
+    company / rekeningnummer / fiscal_year. Amounts more than `tolerance` apart are
+    conflicts; the consolidated amount is the one from the document with the latest
+    fiscal year (then the highest confidence).
+    """
+    tol = int(Decimal(tolerance) * UNIT)
+    df, companies, accounts = _frame(long)
+    df = df.sort_values(KEYS + ["doc_year", "confidence"], kind="stable")
+    stats = df.groupby(KEYS, sort=False).agg(
+        lo=("units", "min"), hi=("units", "max"), n_documents=("document", "nunique"),
+        row=("row", "last"), units=("units", "last")).reset_index()
+    stats["conflict"] = stats["hi"] - stats["lo"] > tol
+    columns = ["company", "rekeningnummer", "postnaam", "fiscal_year", "amount", "document", "source_page"]
+
+    consolidated = _with(
+        long.take(stats["row"].to_numpy()).select(columns[:5] + ["currency"] + columns[5:]),
+        n_documents=pa.array(stats["n_documents"].to_numpy(), pa.int32()),
+        conflict=pa.array(stats["conflict"].to_numpy()),
+    )
+
+    bad = stats.loc[stats["conflict"], KEYS + ["units"]].rename(columns={"units": "consolidated_units"})
+    clash = df.merge(bad, on=KEYS).sort_values(KEYS + ["doc_year", "document"], kind="stable")
+    conflicts = _with(
+        long.take(clash["row"].to_numpy()).select(columns),
+        consolidated_amount=_amounts(clash["consolidated_units"].to_numpy()),
+    )
+
+    length, heads = _prefixes(accounts)
+    cons = stats[KEYS + ["row", "units"]]
+    rolled, is_total = _rollups(cons, length, heads, tol)
+    rollups = _with(
+        long.take(rolled["row"].to_numpy(dtype=np.int64)).select(columns),
+        accounts_amount=_amounts(rolled["accounts_units"].to_numpy()),
+        n_accounts=pa.array(rolled["n_accounts"].to_numpy(), pa.int32()),
+    )
+
+    classes = _class_totals(cons, accounts, length, is_total)
+    class_totals = pa.table({
+        "company": pa.array(companies[classes["company"].to_numpy()], pa.string()),
+        "fiscal_year": pa.array(classes["fiscal_year"].to_numpy(), pa.int32()),
+        "account_class": pa.array(classes["account_class"].to_numpy(), pa.string()),
+        "class_name": pa.array(classes["account_class"].map(ACCOUNT_CLASSES).to_numpy(na_value=None), pa.string()),
+        "amount": _amounts(classes["units"].to_numpy()),
+        "n_accounts": pa.array(classes["n_accounts"].to_numpy(), pa.int32()),
+    })
+
+    warnings = []
+    if conflicts.num_rows:
+        warnings.append(f"{int(stats['conflict'].sum())} account/year amount(s) differ between items "
+                        f"({conflicts.num_rows} items).")
+    if rollups.num_rows:
+        warnings.append(f"{rollups.num_rows} total(s) don't match the sum of their accounts.")
+    return Consolidation(consolidated, conflicts, rollups, class_totals, warnings)
+
+def write_consolidation(result: Consolidation, out_dir: Path) -> None:
+    """consolidated.parquet plus conflicts / rollups / class_totals as CSV in `out_dir`."""
+    import pyarrow.parquet as pq
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pq.write_table(result.consolidated, out_dir / "consolidated.parquet")
+    for name in ("conflicts", "rollups", "class_totals"):
+        getattr(result, name).to_pandas().to_csv(out_dir / f"{name}.csv", sep=";", index=False)
+
+def main():
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", type=Path, help="Parquet dataset written with cli.py --dataset")
+    parser.add_argument("--out-dir", type=Path, default=Path("consolidation"),
+                        help="where to write the result tables (default: ./consolidation)")
+    parser.add_argument("--tolerance", type=Decimal, default=Decimal("0"),
+                        help="amounts at most this far apart are not a conflict (default: 0)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    long = load_dataset(args.dataset)
+    result = consolidate(long, args.tolerance)
+    write_consolidation(result, args.out_dir)
+    print(f"[ok] {long.num_rows} items -> {result.consolidated.num_rows} accounts/years in "
+          f"{time.perf_counter() - t0:.1f}s; tables in {args.out_dir}")
+    for w in result.warnings:
+        print(f"[consolidation] {w}")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,91 @@
 # cli.py
-import sys
+import argparse
 import pathlib
-from app.pipeline.pipeline import run_pipeline
-from app.io.export import to_csv_wide
+import time
+from app.pipeline.batch import company_of, expand_inputs, load_company_map, run_batch, write_outputs
+import settings
+
+def _reconcile(args) -> None:
+    """Consolidate the whole --dataset (all documents so far, not just this run) into --reconcile."""
+    if not args.reconcile:
+        return
+    if not args.dataset.exists():
+        print(f"[consolidation] {args.dataset} has no items yet, nothing to reconcile")
+        return
+    from app.validators.consolidation import consolidate, load_dataset, write_consolidation
+    result = consolidate(load_dataset(args.dataset))
+    write_consolidation(result, args.reconcile)
+    print(f"[ok] Consolidated {result.consolidated.num_rows} accounts/years → {args.reconcile}")
+    for w in result.warnings:
+        print(f"[consolidation] {w}")
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python cli.py <file.pdf>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Extract balance-sheet line items from PDFs.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or globs (e.g. 'Data/*.pdf')")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and don't update the result cache")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="process several PDFs in parallel, models loaded once per worker")
+    parser.add_argument("--threads", type=int, default=settings.WORKER_TORCH_THREADS,
+                        help="torch threads per worker, shared by its OCR and table stages "
+                             "(default: cores / workers)")
+    parser.add_argument("--out-dir", type=pathlib.Path, default=None,
+                        help="where to write <name>.extracted.csv/.parquet (default: next to each PDF)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="per-file wide table format (default: csv)")
+    parser.add_argument("--dataset", type=pathlib.Path, default=None,
+                        help="also append all line items (long layout) to this Parquet dataset")
+    parser.add_argument("--partition-by", choices=["fiscal_year", "company", "none"], default="fiscal_year",
+                        help="dataset partitioning (default: fiscal_year)")
+    parser.add_argument("--company", default=None,
+                        help="company of all the PDFs in the dataset (default: the enterprise number "
+                             "found in each report, else the PDF name)")
+    parser.add_argument("--company-map", type=pathlib.Path, default=None,
+                        help="file;company CSV naming the company per PDF (overrides --company)")
+    parser.add_argument("--reconcile", type=pathlib.Path, default=None, metavar="DIR",
+                        help="afterwards, consolidate the whole --dataset across documents and years "
+                             "(conflicts, account totals) into DIR")
+    parser.add_argument("--summary", type=pathlib.Path, default=None,
+                        help="batch summary CSV (default: <out-dir or .>/batch_summary.csv)")
+    args = parser.parse_args()
+
+    pdfs = expand_inputs(args.inputs)
+    if not pdfs:
+        parser.error("no PDFs found")
+
+    if args.reconcile and args.dataset is None:
+        parser.error("--reconcile needs --dataset")
+    partition_by = () if args.partition_by == "none" else (args.partition_by,)
+    company_map = load_company_map(args.company_map) if args.company_map else None
 
-    pdf_path = pathlib.Path(sys.argv[1])
-    result = run_pipeline(pdf_path)
+    if len(pdfs) == 1 and args.workers <= 1:
+        from app.ml.backend import limit_torch_threads
+        from app.pipeline.pipeline import run_pipeline
+        limit_torch_threads(args.threads)
+        pdf_path = pdfs[0]
+        result = run_pipeline(pdf_path, use_cache=not args.no_cache)
+        company = company_of(pdf_path, result.diagnostics, args.company, company_map)
+        out = write_outputs(result.items, pdf_path, args.out_dir, args.format, args.dataset, partition_by,
+                            company)
+        print(f"[ok] Wrote {out} (cache: {result.diagnostics.get('cache')})")
+        _reconcile(args)
+        return
 
-    out_csv = pdf_path.with_suffix('.extracted.csv')
-    to_csv_wide(result.items, out_csv)
-    print(f"[ok] Wrote {out_csv}")
+    t0 = time.perf_counter()
+    summary = run_batch(pdfs, args.workers, args.out_dir, use_cache=not args.no_cache,
+                        torch_threads=args.threads, fmt=args.format, dataset=args.dataset,
+                        partition_by=partition_by, company=args.company, company_map=company_map)
+    wall = time.perf_counter() - t0
+    summary_path = args.summary or (args.out_dir or pathlib.Path(".")) / "batch_summary.csv"
+    summary.to_csv(summary_path, sep=";", index=False)
+    ok = summary[summary["status"] == "ok"]
+    pages = int(ok["n_pages"].sum()) if len(ok) else 0
+    load = summary.filter(regex=r"^load_.+_s$").sum()
+    print(f"[ok] {len(ok)}/{len(summary)} files, {pages} pages in {wall:.1f}s "
+          f"({pages / wall:.2f} pages/s); summary → {summary_path}")
+    if len(load):
+        models = ", ".join(f"{name[5:-2]} {s:.1f}s" for name, s in load.items())
+        print(f"[ok] model load, all workers: {load.sum():.1f}s ({models})")
+    _reconcile(args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,100 @@
+# settings.py
+import os
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, "1" if default else "0").strip().lower() in ("1", "true", "yes", "on")
+
+# Pages are rendered at this DPI for OCR and table detection.
+# All token / table coordinates in the IR are pixels at this resolution.
+RENDER_DPI = int(os.getenv("RENDER_DPI", "200"))
+
+# Born-digital pages: take tokens from the embedded PDF text layer instead of docTR
+# when the page has at least this many words.
+USE_TEXT_LAYER = _env_bool("USE_TEXT_LAYER", True)
+TEXT_LAYER_MIN_WORDS = int(os.getenv("TEXT_LAYER_MIN_WORDS", "20"))
+# OCR for the other pages: "doctr", or "cascade" = Tesseract first (OCR_TESSERACT_THREADS
+# pages in parallel, 0 = one per CPU) and docTR only for pages with more than
+# OCR_ESCALATE_PAGE_FRAC words below OCR_MIN_WORD_CONF (0-100), or just for the lines
+# holding such words. Much cheaper on clean scans; needs pytesseract + the tesseract binary.
+OCR_ENGINE = os.getenv("OCR_ENGINE", "doctr")
+OCR_TESSERACT_LANG = os.getenv("OCR_TESSERACT_LANG", "eng")
+OCR_TESSERACT_THREADS = int(os.getenv("OCR_TESSERACT_THREADS", "0"))
+OCR_MIN_WORD_CONF = float(os.getenv("OCR_MIN_WORD_CONF", "60"))
+OCR_ESCALATE_PAGE_FRAC = float(os.getenv("OCR_ESCALATE_PAGE_FRAC", "0.3"))
+
+# Pages per Table Transformer forward pass. Higher = better CPU throughput, more memory;
+# 1 = page-at-a-time (lowest latency / memory).
+TABLE_BATCH_SIZE = int(os.getenv("TABLE_BATCH_SIZE", "4"))
+# "page": structure recognition on whole pages (downsized by the model's preprocessor).
+# "crop": locate tables on pages shrunk to TABLE_LOCATE_MAX_PX, then recognise structure
+# on each table crop, scaled so its median text height is TABLE_TEXT_PX pixels
+# (longest side at most TABLE_CROP_MAX_PX, the preprocessor's own cap in "page" mode).
+TABLE_STRUCTURE_MODE = os.getenv("TABLE_STRUCTURE_MODE", "page")
+TABLE_LOCATE_MAX_PX = int(os.getenv("TABLE_LOCATE_MAX_PX", "800"))
+TABLE_TEXT_PX = float(os.getenv("TABLE_TEXT_PX", "14"))
+TABLE_CROP_MAX_PX = int(os.getenv("TABLE_CROP_MAX_PX", "1333"))
+
+# On-disk cache of run_pipeline results, keyed by PDF content + models + settings.
+USE_RESULT_CACHE = _env_bool("USE_RESULT_CACHE", True)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "project007"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+
+# Per-page cache of tokens + table structure, keyed by the rendered page content, so
+# repeated pages skip the models and heuristic changes only re-run parsing.
+PAGE_CACHE_MAX_MB = int(os.getenv("PAGE_CACHE_MAX_MB", "1024"))
+# Layout store (with the cache on): table grids of pages that parsed, keyed by their first
+# LAYOUT_ANCHORS label words, are reused for pages of the same template once checked
+# against the tokens, skipping the structure model. See app.pipeline.layouts.
+USE_LAYOUT_STORE = _env_bool("USE_LAYOUT_STORE", True)
+LAYOUT_ANCHORS = int(os.getenv("LAYOUT_ANCHORS", "24"))
+LAYOUT_STORE_MAX_MB = int(os.getenv("LAYOUT_STORE_MAX_MB", "64"))
+
+# /jobs API: worker processes (each loads the models once), max queued jobs before 429,
+# per-job timeout, and how long finished jobs are kept for polling.
+API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "16"))
+API_JOB_TIMEOUT_S = float(os.getenv("API_JOB_TIMEOUT_S", "600"))
+API_JOB_TTL_S = float(os.getenv("API_JOB_TTL_S", "3600"))
+# Uploads are streamed from the request body to a temp file; larger files are rejected
+# with 413 as soon as they pass the limit (or up front from Content-Length).
+# /extract/batch accepts at most API_MAX_FILES PDFs per request.
+API_MAX_UPLOAD_MB = float(os.getenv("API_MAX_UPLOAD_MB", "100"))
+API_MAX_FILES = int(os.getenv("API_MAX_FILES", "20"))
+# Each API worker runs a dummy inference after loading the models (before taking jobs),
+# so the first request after a deploy is as fast as the rest; /health reports readiness.
+API_WARMUP = _env_bool("API_WARMUP", True)
+# torch threads per worker process (the CLI / a single run: the process), split between
+# its concurrent OCR and table stages; 0 = cpu_count // workers
+WORKER_TORCH_THREADS = int(os.getenv("WORKER_TORCH_THREADS", "0"))
+
+# Pages are rendered, OCR'd and table-detected in windows; a window's images are freed
+# before the next one is rendered, so memory stays flat however long the PDF is.
+# A window holds at most PAGE_WINDOW_PAGES pages (0 = no limit) and at most
+# PAGE_WINDOW_MAX_MB of rendered images (0 = no limit; an A4 page at 200 DPI is ~11 MB).
+PAGE_WINDOW_PAGES = int(os.getenv("PAGE_WINDOW_PAGES", "16"))
+PAGE_WINDOW_MAX_MB = float(os.getenv("PAGE_WINDOW_MAX_MB", "256"))
+# Windows flow render → OCR → tables → parse through queues of PIPELINE_QUEUE_SIZE windows,
+# each stage in its own PIPELINE_*_THREADS threads, so both models are busy at once.
+# Rendered images of up to 3 + 2 * PIPELINE_QUEUE_SIZE windows can be in memory.
+# PIPELINE_OVERLAP=0 runs the stages one after another in the calling thread.
+PIPELINE_OVERLAP = _env_bool("PIPELINE_OVERLAP", True)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "1"))
+PIPELINE_RENDER_THREADS = int(os.getenv("PIPELINE_RENDER_THREADS", "1"))
+PIPELINE_OCR_THREADS = int(os.getenv("PIPELINE_OCR_THREADS", "1"))
+PIPELINE_TABLE_THREADS = int(os.getenv("PIPELINE_TABLE_THREADS", "1"))
+PIPELINE_PARSE_THREADS = int(os.getenv("PIPELINE_PARSE_THREADS", "1"))
+# Pages processed together per window when streaming results (/extract/stream).
+STREAM_WINDOW_PAGES = int(os.getenv("STREAM_WINDOW_PAGES", "1"))
+
+# Page triage before OCR / table detection. TRIAGE_PAGES=0 forces processing of all pages.
+# Text-layer pages are kept with >= MIN_ACCOUNTS account numbers or >= MIN_AMOUNTS amounts;
+# scanned pages with >= MIN_LINES lines of ink on a thumbnail.
+TRIAGE_PAGES = _env_bool("TRIAGE_PAGES", True)
+TRIAGE_MIN_ACCOUNTS = int(os.getenv("TRIAGE_MIN_ACCOUNTS", "3"))
+TRIAGE_MIN_AMOUNTS = int(os.getenv("TRIAGE_MIN_AMOUNTS", "6"))
+TRIAGE_MIN_LINES = int(os.getenv("TRIAGE_MIN_LINES", "8"))
+
+# CPU inference backend for docTR and the Table Transformer: "fp32" (reference) or
+# "int8" (dynamic quantization, exported once under CACHE_DIR/models).
+# Check the line-item impact first: python -m app.ml.backend_check Data/*.pdf
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "fp32")
@@ -0,0 +1,173 @@
+# tests/benchmark.py
+"""
+Speed + accuracy benchmark of run_pipeline over the Data/ corpus.
+
+    python tests/benchmark.py                          # all Data/*.pdf → bench_results.json
+    python tests/benchmark.py Data/frizo_ex.pdf --out run.json --compare baseline.json
+    python tests/benchmark.py --update-golden          # after reviewing the output! (not scored)
+
+Per document: wall time per stage (diagnostics["timings"]), pages/s, items, and precision /
+recall of (rekeningnummer, fiscal_year, amount) against tests/golden/<name>.csv, which
+uses the wide layout written by cli.py (see app.io.golden; a golden that covers only some
+pages scores only the items of those pages). The totals add the peak RSS of the whole run (a
+process high-water mark, so it is not reported per document). With --compare the run is
+checked against an earlier JSON and exits 1 on a slowdown or a precision / recall drop beyond
+the thresholds.
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import pathlib
+from collections import defaultdict
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from app.io.export import to_csv_wide
+from app.io.golden import facts, golden_pages, read_wide, score
+from app.pipeline.batch import expand_inputs
+from app.pipeline import pipeline
+import settings
+
+GOLDEN_DIR = PROJECT_ROOT / "tests" / "golden"
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KiB on Linux
+
+def bench_doc(pdf: pathlib.Path, tmp_csv: pathlib.Path, update_golden: bool) -> dict:
+    t0 = time.perf_counter()
+    result = pipeline.run_pipeline(pdf, use_cache=False)
+    wall = time.perf_counter() - t0
+    n_pages = result.diagnostics.get("n_pages", 0)
+    row = {
+        "file": pdf.name,
+        "n_pages": n_pages,
+        "n_items": len(result.items),
+        "wall_s": round(wall, 3),
+        "pages_per_s": round(n_pages / wall, 3) if wall else None,
+        "stages_s": {k: round(v, 3) for k, v in result.diagnostics.get("timings", {}).items()},
+        "golden": None,
+    }
+    golden = GOLDEN_DIR / f"{pdf.stem}.csv"
+    pages = golden_pages(golden)
+    items = [i for i in result.items if pages is None or i.source_page in pages]
+    if update_golden:
+        # this run becomes the golden; scoring it against itself would say nothing
+        if items:
+            GOLDEN_DIR.mkdir(parents=True, exist_ok=True)
+            to_csv_wide(items, golden)
+        elif golden.exists():
+            raise SystemExit(f"[golden] {pdf.name}: no items on the golden's pages, "
+                             f"{golden} left unchanged; check the run before updating")
+        else:
+            print(f"[golden] {pdf.name}: no items, no golden written")
+        return row
+    if golden.exists():
+        pred = set()
+        if items:
+            to_csv_wide(items, tmp_csv)
+            pred = facts(read_wide(tmp_csv))
+        row["golden"] = score(pred, facts(read_wide(golden)))
+    return row
+
+def _totals(docs: list) -> dict:
+    wall = sum(d["wall_s"] for d in docs)
+    pages = sum(d["n_pages"] for d in docs)
+    stages = defaultdict(float)
+    for d in docs:
+        for k, v in d["stages_s"].items():
+            stages[k] += v
+    scored = [d["golden"] for d in docs if d["golden"]]
+    tp, fp, fn = (sum(g[k] for g in scored) for k in ("tp", "fp", "fn"))
+    return {
+        "n_docs": len(docs), "n_pages": pages, "n_items": sum(d["n_items"] for d in docs),
+        "wall_s": round(wall, 3), "pages_per_s": round(pages / wall, 3) if wall else None,
+        "stages_s": {k: round(v, 3) for k, v in stages.items()},
+        "peak_rss_mb": _peak_rss_mb(),
+        "golden": _score_totals(tp, fp, fn) if scored else None,
+    }
+
+def _score_totals(tp: int, fp: int, fn: int) -> dict:
+    return {"tp": tp, "fp": fp, "fn": fn,
+            "precision": round(tp / (tp + fp), 4) if tp + fp else None,
+            "recall": round(tp / (tp + fn), 4) if tp + fn else None}
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(run: dict, base: dict, max_slowdown: float, max_recall_drop: float,
+            max_precision_drop: float = 0.01) -> list:
+    """Regressions of `run` vs `base` (per document and in total)."""
+    problems = []
+    base_docs = {d["file"]: d for d in base["docs"]}
+    pairs = [(d["file"], d, base_docs[d["file"]]) for d in run["docs"] if d["file"] in base_docs]
+    if {d["file"] for d in run["docs"]} == set(base_docs):
+        pairs.append(("TOTAL", run["totals"], base["totals"]))
+    for name, new, old in pairs:
+        if old["wall_s"] and new["wall_s"] > old["wall_s"] * max_slowdown:
+            problems.append(f"{name}: wall {old['wall_s']}s → {new['wall_s']}s")
+        for metric, max_drop in (("precision", max_precision_drop), ("recall", max_recall_drop)):
+            v_new = (new.get("golden") or {}).get(metric)
+            v_old = (old.get("golden") or {}).get(metric)
+            if v_new is not None and v_old is not None and v_new < v_old - max_drop:
+                problems.append(f"{name}: {metric} {v_old} → {v_new}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", default=[str(PROJECT_ROOT / "Data")])
+    parser.add_argument("--out", type=pathlib.Path, default=pathlib.Path("bench_results.json"))
+    parser.add_argument("--compare", type=pathlib.Path, default=None, help="earlier results JSON")
+    parser.add_argument("--max-slowdown", type=float, default=1.25)
+    parser.add_argument("--max-recall-drop", type=float, default=0.01)
+    parser.add_argument("--max-precision-drop", type=float, default=0.01)
+    parser.add_argument("--update-golden", action="store_true", help="overwrite tests/golden with this run")
+    args = parser.parse_args()
+
+    pdfs = expand_inputs(args.inputs)
+    model_load_s = pipeline.load_models()
+
+    tmp_csv = args.out.with_suffix(".tmp.csv")
+    docs = []
+    for pdf in pdfs:
+        row = bench_doc(pdf, tmp_csv, args.update_golden)
+        docs.append(row)
+        g = row["golden"] or {}
+        print(f"{row['file']:50} {row['n_pages']:4}p {row['wall_s']:8.2f}s {row['n_items']:5} items "
+              f"P={g.get('precision')} R={g.get('recall')}")
+    tmp_csv.unlink(missing_ok=True)
+
+    run = {
+        "meta": {
+            "git": _git_rev(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "machine": platform.machine(),
+            "model_load_s": model_load_s,
+            "settings": {k: getattr(settings, k) for k in dir(settings) if k.isupper()},
+        },
+        "docs": docs,
+        "totals": _totals(docs),
+    }
+    args.out.write_text(json.dumps(run, indent=2, default=str))
+    t = run["totals"]
+    print(f"\n{t['n_docs']} docs, {t['n_pages']} pages, {t['wall_s']}s ({t['pages_per_s']} pages/s), "
+          f"peak RSS {t['peak_rss_mb']} MB, golden {t['golden']} → {args.out}")
+
+    if args.compare:
+        problems = compare(run, json.loads(args.compare.read_text()), args.max_slowdown, args.max_recall_drop,
+                           args.max_precision_drop)
+        for p in problems:
+            print(f"[regression] {p}")
+        sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# tests/conftest.py
+import sys
+import pathlib
+import numpy as np
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from app.ir.schema import PageIR, TableBlock, TableCell, TokenArray
+import settings
+
+# x-ranges of the columns of the synthetic balance page, in px
+COLUMNS = [(100, 250), (250, 500), (500, 700), (700, 900)]
+ROW_TOP, ROW_H = 200, 30
+
+BALANCE_ROWS = [("Rekening", "Omschrijving", "2023", "2022")] + [
+    (str(600000 + 100 * i), "Omzet", f"1.{i}34,56", f"{i}87,00") for i in range(8)
+]
+
+def make_tokens(rows, page: int = 0) -> TokenArray:
+    """One token per non-empty cell text, centred in its cell."""
+    text, boxes = [], []
+    for r, row in enumerate(rows):
+        for (x0, x1), t in zip(COLUMNS, row):
+            if t:
+                cx, cy = (x0 + x1) / 2, ROW_TOP + ROW_H * r + ROW_H / 2
+                text.append(t)
+                boxes.append((cx - 4 * len(t), cy - 7, cx + 4 * len(t), cy + 7))
+    return TokenArray(text, np.array(boxes), np.full(len(text), page))
+
+def make_table(n_rows: int, page: int = 0) -> TableBlock:
+    """The grid the structure model would find for make_tokens(rows) with n_rows rows."""
+    cells = [TableCell(row=r, col=c, page=page,
+                       bbox=(x0, ROW_TOP + ROW_H * r, x1, ROW_TOP + ROW_H * (r + 1)))
+             for r in range(n_rows) for c, (x0, x1) in enumerate(COLUMNS)]
+    return TableBlock(page=page, bbox=(COLUMNS[0][0], ROW_TOP, COLUMNS[-1][1], ROW_TOP + ROW_H * n_rows),
+                      cells=cells, n_rows=n_rows, n_cols=len(COLUMNS))
+
+@pytest.fixture
+def balance_page():
+    """Factory: a text page with one balance table; `tables=False` leaves the grid to be found."""
+    def make(rows=BALANCE_ROWS, tables=True, page=0) -> PageIR:
+        return PageIR(page=page, width=1000, height=1400, tokens=make_tokens(rows, page),
+                      tables=[make_table(len(rows), page)] if tables else [], token_source="text_layer")
+    return make
+
+@pytest.fixture
+def balance_rows():
+    """The rows of balance_page(): a header and eight account rows."""
+    return list(BALANCE_ROWS)
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,31 @@
+# tests/test_accounting_rules.py
+from decimal import Decimal
+from app.io.schema import LineItem
+from app.validators.accounting_rules import reconcile
+
+def _item(acc, amount, year=2023, confidence=None):
+    return LineItem(rekeningnummer=acc, postnaam="x", amount=Decimal(amount),
+                    fiscal_year=year, confidence=confidence)
+
+def test_empty_document():
+    assert reconcile([]) == ["No items extracted."]
+
+def test_consistent_document_has_no_warnings():
+    items = [_item("60", "30"), _item("600000", "10"), _item("604000", "20.00"),
+             _item("600000", "10.0"), _item("60", "25", year=2022), _item("600000", "25", year=2022)]
+    assert reconcile(items) == []
+
+def test_duplicates_and_rollups():
+    items = [_item("600000", "10", confidence=0.9), _item("600000", "12", confidence=0.5),
+             _item("604000", "20"), _item("60", "30"), _item("6", "31")]
+    # the more confident 600000 is used for the rollups: 60 adds up, 6 does not
+    assert reconcile(items) == ["1 account/year amount(s) differ between items (2 items).",
+                                "1 total(s) don't match the sum of their accounts."]
+
+def test_tax_form_codes_are_not_totals():
+    # boxes of the tax forms printed next to the statements: 1058 / 8310 prefix accounts
+    # but are no total of them; 10 only adds up its ledger accounts
+    items = [_item("10", "100"), _item("105800", "60"), _item("109000", "40"), _item("1058", "7"),
+             _item("8310", "12"), _item("831000", "5")]
+    assert reconcile(items) == []
+    assert reconcile(items + [_item("83", "6")]) == ["1 total(s) don't match the sum of their accounts."]
@@ -0,0 +1,60 @@
+# tests/test_api.py
+import json
+import tempfile
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.api import server
+from app.api.jobs import Job
+from app.io.schema import PageResult
+import settings
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """The API without its lifespan (no worker processes), uploads saved under tmp_path."""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(settings, "API_MAX_UPLOAD_MB", 0.01)  # ~10 kB
+    return TestClient(server.app)
+
+def test_upload_is_written_once_to_the_job_file(client, tmp_path):
+    body = b"%PDF-1.4 " + bytes(range(256)) * 20
+    r = client.post("/jobs", files={"file": ("a.pdf", body, "application/pdf")}, data={"note": "x"})
+    assert r.status_code == 202
+    job = server.pool.get(r.json()["job_id"])
+    assert job.pdf_path.parent == tmp_path and job.pdf_path.read_bytes() == body
+    server.pool.cancel(job.id)
+
+def test_too_large_uploads_are_refused_and_removed(client, tmp_path):
+    big = b"0" * 20_000
+    r = client.post("/extract", files={"file": ("big.pdf", big, "application/pdf")})
+    assert r.status_code == 413 and "big.pdf" in r.json()["detail"]
+    # refused from Content-Length alone, before the body is read
+    r = client.post("/extract", content=b"0" * 50_000,
+                    headers={"content-type": "multipart/form-data; boundary=x"})
+    assert r.status_code == 413 and r.json()["detail"].startswith("Request larger")
+    r = client.post("/extract", files=[("file", ("a.pdf", b"1", "application/pdf")),
+                                       ("file", ("b.pdf", b"2", "application/pdf"))])
+    assert r.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+def test_stream_follows_the_job_from_its_thread(client, monkeypatch):
+    """Pages and the end of the job arrive from the pool's thread while the request waits on its loop."""
+    jobs = []
+
+    def submit_many(paths, **kw):
+        jobs.append(Job(id="j", pdf_path=paths[0], **kw))
+        threading.Thread(target=finish, args=(jobs[-1],)).start()
+        return jobs
+
+    def finish(job):
+        for page in (1, 2):
+            time.sleep(0.05)
+            job._push(PageResult(page=page, items=[], warnings=[], diagnostics={}))
+        server.pool._finish(job, "failed", error="boom")
+
+    monkeypatch.setattr(server.pool, "submit_many", submit_many)
+    r = client.post("/extract/stream", files={"file": ("a.pdf", b"%PDF", "application/pdf")})
+    assert [(line["type"], line.get("page")) for line in map(json.loads, r.text.splitlines())] == [
+        ("page", 1), ("page", 2), ("error", None)]
+    assert jobs[0]._listeners == []
@@ -0,0 +1,21 @@
+# tests/test_backend.py
+import sys
+import types
+from app.ml import backend
+import settings
+
+def test_torch_threads_are_shared_by_concurrent_stages(monkeypatch):
+    calls = []
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(set_num_threads=calls.append))
+    monkeypatch.setattr(backend, "_torch_threads", 0)
+    monkeypatch.setattr(settings, "PIPELINE_OVERLAP", True)
+    monkeypatch.setattr(settings, "PIPELINE_OCR_THREADS", 1)
+    monkeypatch.setattr(settings, "PIPELINE_TABLE_THREADS", 2)
+    monkeypatch.setattr(settings, "WORKER_TORCH_THREADS", 12)
+    # a run without load_models: the configured cores, split over 1 OCR + 2 table threads
+    assert backend.limit_torch_threads() == 4
+    assert backend.limit_torch_threads(6) == 2  # load_models of a worker
+    assert backend.limit_torch_threads() == 2  # later runs keep the worker's cap
+    monkeypatch.setattr(settings, "PIPELINE_OVERLAP", False)
+    assert backend.limit_torch_threads(6) == 6
+    assert calls == [4, 2, 6]
@@ -0,0 +1,54 @@
+# tests/test_cache.py
+import threading
+from app.ir.schema import DocIR
+from app.io.schema import ExtractionResult, LineItem
+from app.pipeline import cache
+import settings
+
+def test_result_round_trip(cache_dir, balance_page):
+    ir = DocIR(pages=[balance_page()])
+    result = ExtractionResult(items=[LineItem(rekeningnummer="600000", postnaam="Omzet", amount="1234.56",
+                                              fiscal_year=2023, source_page=0)],
+                              warnings=[], diagnostics={"n_pages": 1})
+    key = cache.make_key(b"pdf bytes", {"v": 1})
+    assert cache.load(key) is None
+    cache.store(key, ir, result)
+    ir2, result2 = cache.load(key)
+    assert result2 == result
+    assert ir2.pages[0].tokens == ir.pages[0].tokens
+    assert cache.load(cache.make_key(b"pdf bytes", {"v": 2})) is None  # fingerprint is part of the key
+
+def test_page_round_trip_renumbers(cache_dir, balance_page):
+    page = balance_page()
+    cache.store_pages({"k": page})
+    loaded = cache.load_page("k", 5)
+    assert loaded.page == 5 and set(loaded.tokens.page.tolist()) == {5}
+    assert loaded.tokens.text == page.tokens.text
+    assert [c.bbox for c in loaded.tables[0].cells] == [c.bbox for c in page.tables[0].cells]
+
+def test_unreadable_entry_is_a_miss(cache_dir):
+    (cache._dir("results") / "bad.json").write_text("{trunc", encoding="utf-8")
+    assert cache.load("bad") is None
+    assert not (cache._dir("results") / "bad.json").exists()
+
+def test_concurrent_writers_publish_whole_files(cache_dir):
+    data = [{"n": i, "pad": "x" * 200_000} for i in range(8)]
+    threads = [threading.Thread(target=cache._write, args=("pages", "same", d)) for d in data]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache._read("pages", "same") in data
+    assert not list(cache._dir("pages").glob("*.tmp"))
+
+def test_page_key_follows_model_weights(monkeypatch):
+    from app.ml import hf_table_transformer
+    from app.pipeline import pipeline
+    monkeypatch.setattr(settings, "TABLE_STRUCTURE_MODE", "crop")
+    revisions = {}
+    monkeypatch.setattr(hf_table_transformer, "hf_revision", lambda repo_id: revisions.get(repo_id, "a"))
+    before = pipeline._ml_fingerprint()
+    for model in (hf_table_transformer.MODEL_NAME, hf_table_transformer.DETECTION_MODEL_NAME):
+        revisions[model] = "b"
+        assert pipeline._ml_fingerprint() != before
+        before = pipeline._ml_fingerprint()
@@ -0,0 +1,27 @@
+# tests/test_company.py
+from pathlib import Path
+from app.extractors.company import company_number
+from app.pipeline.batch import company_of, load_company_map
+
+def test_company_number_formats_and_checksum():
+    assert company_number(["Belfond KBO: 0845.561.371"]) == "0845.561.371"
+    assert company_number(["BTW-nr BE 0471 465 728"]) == "0471.465.728"
+    assert company_number(["Ond.nr. 0437025976 Pagina 1/2"]) == "0437.025.976"
+    # same shape, wrong check digits (an amount or account number)
+    assert company_number(["Totaal 0845.561.372", "1.234.567.890"]) is None
+
+def test_company_number_most_frequent():
+    texts = ["Ond.nr. 0503.817.010", "Ond.nr. 0503.817.010", "klant 0471.465.728"]
+    assert company_number(texts) == "0503.817.010"
+
+def test_company_of_precedence(tmp_path):
+    pdf = Path("Data/frizo_ex.pdf")
+    found = {"company_number": "0471.465.728"}
+    assert company_of(pdf, {}) == "frizo_ex"
+    assert company_of(pdf, found) == "0471.465.728"
+    assert company_of(pdf, found, "Frizo") == "Frizo"
+    mapping = tmp_path / "companies.csv"
+    mapping.write_text("file;company\nfrizo_ex.pdf;Frizo BV\nother;X\n", encoding="utf-8")
+    company_map = load_company_map(mapping)
+    assert company_map == {"frizo_ex": "Frizo BV", "other": "X"}
+    assert company_of(pdf, found, "Frizo", company_map) == "Frizo BV"
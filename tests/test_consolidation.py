@@ -0,0 +1,55 @@
+# tests/test_consolidation.py
+from decimal import Decimal
+from app.io.schema import LineItem
+from app.validators.consolidation import consolidate, from_documents
+
+def _item(acc, amount, year, page=1):
+    return LineItem(rekeningnummer=acc, postnaam="x", amount=Decimal(amount), fiscal_year=year,
+                    source_page=page, confidence=0.75)
+
+def _rows(table, *columns):
+    return sorted(zip(*(table[c].to_pylist() for c in columns)))
+
+def test_comparative_years_join_across_documents():
+    docs = {
+        "2022.pdf": [_item("600000", "10", 2022), _item("604000", "20", 2022)],
+        "2023.pdf": [_item("600000", "11", 2023), _item("600000", "10.00", 2022), _item("604000", "20", 2022)],
+    }
+    result = consolidate(from_documents(docs, {"2022.pdf": "0123.456.749", "2023.pdf": "0123.456.749"}))
+    assert _rows(result.consolidated, "rekeningnummer", "fiscal_year", "amount", "n_documents") == [
+        ("600000", 2022, Decimal("10"), 2), ("600000", 2023, Decimal("11"), 1), ("604000", 2022, Decimal("20"), 2)]
+    assert result.conflicts.num_rows == 0 and result.warnings == []
+
+def test_conflict_keeps_the_latest_document():
+    docs = {"2022.pdf": [_item("600000", "10", 2022)],
+            "2023.pdf": [_item("600000", "11", 2023), _item("600000", "12.5", 2022)]}
+    result = consolidate(from_documents(docs, {"2022.pdf": "c", "2023.pdf": "c"}))
+    assert _rows(result.conflicts, "document", "amount", "consolidated_amount") == [
+        ("2022.pdf", Decimal("10"), Decimal("12.5")), ("2023.pdf", Decimal("12.5"), Decimal("12.5"))]
+    assert result.warnings == ["1 account/year amount(s) differ between items (2 items)."]
+    # within the tolerance it is not a conflict
+    assert consolidate(from_documents(docs, {"2022.pdf": "c", "2023.pdf": "c"}), Decimal("3")).conflicts.num_rows == 0
+
+def test_companies_are_not_joined():
+    docs = {"a.pdf": [_item("600000", "10", 2022)], "b.pdf": [_item("600000", "99", 2022)]}
+    result = consolidate(from_documents(docs))  # each document its own company
+    assert result.conflicts.num_rows == 0 and result.consolidated.num_rows == 2
+
+def test_rollups_and_class_totals():
+    items = [_item("60", "30", 2023), _item("600000", "10", 2023), _item("604000", "20", 2023),
+             _item("61", "50", 2023), _item("610000", "45", 2023), _item("6", "75", 2023),
+             _item("700000", "-5.25", 2023)]
+    result = consolidate(from_documents({"r.pdf": items}))
+    # 61 is 5 off; 6 matches the leaves under it (totals 60 / 61 are not counted twice)
+    assert _rows(result.rollups, "rekeningnummer", "amount", "accounts_amount", "n_accounts") == [
+        ("61", Decimal("50"), Decimal("45"), 1)]
+    assert _rows(result.class_totals, "account_class", "class_name", "amount", "n_accounts") == [
+        ("6", "Kosten", Decimal("75"), 3), ("7", "Opbrengsten", Decimal("-5.25"), 1)]
+    assert result.warnings == ["1 total(s) don't match the sum of their accounts."]
+
+def test_tax_form_codes_are_left_out():
+    items = [_item("10", "100", 2023), _item("105800", "100", 2023), _item("1058", "7", 2023),
+             _item("8310", "12", 2023)]
+    result = consolidate(from_documents({"r.pdf": items}))
+    assert result.rollups.num_rows == 0 and result.warnings == []
+    assert _rows(result.class_totals, "account_class", "amount", "n_accounts") == [("1", Decimal("100"), 1)]
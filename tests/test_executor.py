@@ -0,0 +1,51 @@
+# tests/test_executor.py
+import random
+import threading
+import time
+import pytest
+from app.pipeline.executor import Stage, run_stages
+
+def _stage_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("stage-")]
+
+def _jitter(x):
+    time.sleep(random.random() / 200)
+    return x
+
+STAGES = [Stage("double", lambda x: 2 * x), Stage("slow", _jitter, threads=4), Stage("inc", lambda x: x + 1)]
+
+@pytest.mark.parametrize("overlap", [True, False])
+def test_results_in_source_order(overlap):
+    assert list(run_stages(range(50), STAGES, queue_size=2, overlap=overlap)) == [2 * x + 1 for x in range(50)]
+
+def test_stage_runs_concurrently():
+    seen = set()
+    def record(x):
+        seen.add(threading.current_thread().name)
+        time.sleep(0.01)
+        return x
+    list(run_stages(range(20), [Stage("ocr", record, threads=3)]))
+    assert len(seen) > 1 and all(n.startswith("stage-ocr-") for n in seen)
+
+def test_stage_error_is_raised_and_stops_all_stages():
+    def fail(x):
+        if x == 5:
+            raise ValueError("bad page")
+        return x
+    with pytest.raises(ValueError, match="bad page"):
+        list(run_stages(range(100), [Stage("a", _jitter), Stage("fail", fail, threads=2)]))
+    assert not _stage_threads()
+
+def test_source_error_is_raised():
+    def source():
+        yield 1
+        raise OSError("unreadable pdf")
+    with pytest.raises(OSError, match="unreadable pdf"):
+        list(run_stages(source(), STAGES))
+    assert not _stage_threads()
+
+def test_closing_early_stops_all_stages():
+    gen = run_stages(range(1000), STAGES, queue_size=1)
+    assert next(gen) == 1
+    gen.close()
+    assert not _stage_threads()
@@ -0,0 +1,57 @@
+# tests/test_export.py
+from decimal import Decimal
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from app.io.export import AMOUNT_TYPE, LONG_SCHEMA, append_dataset, to_arrow_long, to_arrow_wide, to_parquet
+from app.io.schema import LineItem
+
+def _item(acc, amount, year, page=1):
+    return LineItem(rekeningnummer=acc, postnaam=f"post {acc}", amount=Decimal(amount),
+                    fiscal_year=year, source_page=page, confidence=0.75)
+
+def test_long_amounts_round_trip_exactly(tmp_path):
+    items = [_item("600000", "1234567890123.45", 2023), _item("212009", "-39789.34", 2023),
+             _item("700000", "0.01", 2022)]
+    table = to_arrow_long(items, "r.pdf")
+    assert table.schema == LONG_SCHEMA
+    assert table.column("company").to_pylist() == ["r.pdf"] * 3  # defaults to the document
+    to_parquet(items, tmp_path / "r.parquet", layout="long", document="r.pdf", company="c")
+    back = pq.read_table(tmp_path / "r.parquet")
+    assert back.schema.field("amount").type == AMOUNT_TYPE
+    assert back.column("amount").to_pylist() == [i.amount for i in items]
+
+def test_wide_averages_duplicates(tmp_path):
+    items = [_item("600000", "10", 2023), _item("600000", "10.01", 2023, page=2),
+             _item("600000", "8", 2022), _item("604000", "20", 2022)]
+    wide = to_arrow_wide(to_arrow_long(items, "r.pdf"))
+    assert wide.column_names == ["document", "company", "rekeningnummer", "postnaam", "2022", "2023"]
+    assert wide.schema.field("2023").type == AMOUNT_TYPE
+    assert wide.to_pylist() == [
+        {"document": "r.pdf", "company": "r.pdf", "rekeningnummer": "600000", "postnaam": "post 600000",
+         "2022": Decimal("8"), "2023": Decimal("10.005")},
+        {"document": "r.pdf", "company": "r.pdf", "rekeningnummer": "604000", "postnaam": "post 604000",
+         "2022": Decimal("20"), "2023": None}]
+    to_parquet(items, tmp_path / "r.parquet", document="r.pdf")
+    assert pq.read_table(tmp_path / "r.parquet").equals(wide)
+
+def test_dataset_appends_per_company_and_year(tmp_path):
+    base = tmp_path / "ds"
+    docs = {("2023.pdf", "Immo Bos"): [_item("600000", "11", 2023), _item("600000", "10", 2022)],
+            ("2022.pdf", "Immo Bos"): [_item("600000", "10", 2022)],
+            ("x.pdf", "Other BV"): [_item("700000", "-5.25", 2023)]}
+    for (document, company), items in docs.items():
+        append_dataset(items, base, document, company, partition_by=("company", "fiscal_year"))
+    append_dataset([], base, "empty.pdf")  # nothing to write
+    # one file per document and partition; partition values are URI-encoded in the paths
+    assert sorted(p.relative_to(base).parent.as_posix() for p in base.rglob("*.parquet")) == [
+        "company=Immo%20Bos/fiscal_year=2022", "company=Immo%20Bos/fiscal_year=2022",
+        "company=Immo%20Bos/fiscal_year=2023", "company=Other%20BV/fiscal_year=2023"]
+    table = ds.dataset(base, schema=LONG_SCHEMA, partitioning="hive").to_table()
+    table = table.sort_by([("document", "ascending"), ("fiscal_year", "ascending")])
+    assert table.num_rows == 4
+    assert table.select(["document", "company", "rekeningnummer", "fiscal_year", "amount"]).to_pylist() == [
+        {"document": d, "company": c, "rekeningnummer": i.rekeningnummer, "fiscal_year": i.fiscal_year,
+         "amount": i.amount}
+        for (d, c), items in sorted(docs.items()) for i in sorted(items, key=lambda i: i.fiscal_year)]
+    assert pc.sum(table.column("amount")).as_py() == Decimal("25.75")
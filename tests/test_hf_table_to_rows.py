@@ -0,0 +1,105 @@
+# tests/test_hf_table_to_rows.py
+import pathlib
+from decimal import Decimal
+import fitz
+import numpy as np
+import pandas as pd
+from app.extractors.text_layer import text_layer_tokens
+from app.io.export import to_csv_wide
+from app.io.golden import facts, golden_pages, read_wide
+from app.ir.schema import DocIR, PageIR, TableBlock, TableCell
+from app.parsers.hf_table_to_rows import (RE_ACC, _normalize_numbers, assign_tokens, page_to_lineitems,
+                                          tables_to_lineitems)
+from app.pipeline.render import page_size
+import settings
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+STATEMENT = PROJECT_ROOT / "Data" / "immo_bos_multiple_yr.pdf"
+GOLDEN = PROJECT_ROOT / "tests" / "golden" / f"{STATEMENT.stem}.csv"
+# "Interne jaarrekening": the balance sheet and income statement pages the golden covers
+STATEMENT_PAGES = golden_pages(GOLDEN)
+# subtotals as printed in the statements (2023, 2022), each the sum of the accounts
+# starting with the prefix: checked by hand against the PDF, independent of the parser
+SECTION_TOTALS = {
+    "13": ("132720.57", "135689.05"),  # III. Reserves
+    "2": ("54478.75", "45565.29"),     # Vaste activa
+    "22": ("2755.45", "26743.20"),     # A. Terreinen en gebouwen
+    "24": ("22834.67", "13077.71"),    # C. Meubilair en rollend materieel
+    "40": ("131472.36", "71898.67"),   # A. Handelsvorderingen
+    "44": ("104647.95", "89343.06"),   # C. Handelsschulden
+    "5": ("97794.89", "113490.36"),    # IX. Liquide middelen
+    "61": ("745106.53", "701294.26"),  # B. Diensten en diverse goederen
+    "70": ("942134.43", "902759.56"),  # A. Omzet
+}
+# single accounts read off the pages, incl. negative depreciation lines
+ACCOUNTS = [("212009", 2023, "-39789.34"), ("221000", 2022, "495443.14"),
+            ("221009", 2022, "-472288.85"), ("700000", 2023, "829208.56")]
+# left edge of the labels, right edges of the label / 2023 / 2022 columns, in pt
+LABEL_X0_PT = 20
+COLUMN_X1_PT = (440, 509, 580)
+
+def _lines(tokens) -> list:
+    """Token indices per text line, top to bottom, each left to right."""
+    _, cy = tokens.centers()
+    lines, last = [], None
+    for i in np.argsort(cy, kind="stable"):
+        if last is None or cy[i] - last > 5:
+            lines.append([])
+        lines[-1].append(i)
+        last = cy[i]
+    return [sorted(line, key=lambda i: tokens.x0[i]) for line in lines]
+
+def _statement_page(doc: fitz.Document, i: int) -> PageIR:
+    """
+    A statement page with the grid of its table: a row per text line from the "(EUR)"
+    header on, account / name / 2023 / 2022 columns. The account numbers sit at four
+    indents, so the account cell ends after each row's own number.
+    """
+    tokens = text_layer_tokens(doc[i], i, settings.RENDER_DPI)
+    scale = settings.RENDER_DPI / 72
+    x0, ends = LABEL_X0_PT * scale, [x * scale for x in COLUMN_X1_PT]
+    lines = _lines(tokens)
+    header = next(n for n, line in enumerate(lines) if "(EUR)" in [tokens.text[j] for j in line])
+    cells = []
+    for r, line in enumerate(lines[header:]):
+        y0, y1 = tokens.y0[line].min() - 2, tokens.y1[line].max() + 2
+        first = line[0]
+        split = tokens.x1[first] + 1 if tokens.x1[first] < ends[0] and RE_ACC.match(tokens.text[first]) else x0
+        for c, (a, b) in enumerate(zip([x0, split, *ends[:-1]], [split, *ends])):
+            cells.append(TableCell(row=r, col=c, page=i, bbox=(a, y0, b, y1)))
+    n_rows = len(lines) - header
+    table = TableBlock(page=i, bbox=(x0, cells[0].bbox[1], ends[-1], cells[-1].bbox[3]),
+                       cells=cells, n_rows=n_rows, n_cols=4)
+    w, h = page_size(doc[i], settings.RENDER_DPI)
+    return PageIR(page=i, width=w, height=h, tokens=tokens, tables=[table], token_source="text_layer")
+
+def test_normalize_numbers_signs():
+    raw = pd.Series(["1.234,56", "-1.234,56", "– 12,5", "—7", "(1.234)", "- 12,5 EUR", "987,00", "Omzet"])
+    out = _normalize_numbers(raw)
+    assert out.iloc[:7].tolist() == [1234.56, -1234.56, -12.5, -7.0, -1234.0, -12.5, 987.0]
+    assert pd.isna(out.iloc[7])
+
+def test_leading_minus_amounts_are_negative(balance_page):
+    # depreciation accounts as printed in the statements of Data/immo_bos_multiple_yr.pdf
+    rows = [("Rekening", "Omschrijving", "2023", "2022"),
+            ("212009", "Afschr. op goodwill", "-39.789,34", "-39.789,34"),
+            ("221009", "Afschr. op gebouwen", "-494.801,26", "(472.288,85)")]
+    page = balance_page(rows)
+    assign_tokens(page)
+    assert [(i.rekeningnummer, i.fiscal_year, i.amount) for i in page_to_lineitems(page)] == [
+        ("212009", 2023, Decimal("-39789.34")), ("212009", 2022, Decimal("-39789.34")),
+        ("221009", 2023, Decimal("-494801.26")), ("221009", 2022, Decimal("-472288.85"))]
+
+def test_statement_matches_golden(tmp_path):
+    with fitz.open(str(STATEMENT)) as doc:
+        ir = DocIR(pages=[_statement_page(doc, i) for i in STATEMENT_PAGES])
+    items = tables_to_lineitems(ir)
+    assert {i.fiscal_year for i in items} == {2022, 2023}
+    amounts = {(i.rekeningnummer, i.fiscal_year): i.amount for i in items}
+    for acc, year, amount in ACCOUNTS:
+        assert amounts[acc, year] == Decimal(amount)
+    for prefix, totals in SECTION_TOTALS.items():
+        for year, total in zip((2023, 2022), totals):
+            assert sum(a for (acc, y), a in amounts.items() if acc.startswith(prefix) and y == year) == Decimal(total)
+    to_csv_wide(items, tmp_path / "items.csv")
+    assert facts(read_wide(tmp_path / "items.csv")) == facts(read_wide(GOLDEN))
@@ -0,0 +1,17 @@
+# tests/test_jobs.py
+import pytest
+from app.api.jobs import QueueFull, WorkerPool
+
+def test_cancelling_a_queued_job_frees_its_slot(tmp_path):
+    pool = WorkerPool(n_workers=1, max_queue=2, timeout_s=10, ttl_s=60)  # not started: jobs stay queued
+    pdfs = [tmp_path / f"{n}.pdf" for n in "abc"]
+    for pdf in pdfs:
+        pdf.write_bytes(b"%PDF")
+    a, b = pool.submit_many(pdfs[:2], cleanup=True)
+    with pytest.raises(QueueFull):
+        pool.submit(pdfs[2])
+    pool.cancel(a.id)
+    assert a.is_finished and a.status == "cancelled" and not pdfs[0].exists()
+    assert a.pages.get_nowait() is None  # a stream of it ends too
+    c = pool.submit(pdfs[2])
+    assert [pool._queue.get_nowait() for _ in range(2)] == [b, c]
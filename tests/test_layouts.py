@@ -0,0 +1,81 @@
+# tests/test_layouts.py
+from app.ml import hf_table_transformer
+from app.parsers import hf_table_to_rows
+from app.parsers.hf_table_to_rows import assign_tokens, page_to_lineitems
+from app.pipeline import cache, layouts, pipeline
+
+def _parse(page):
+    assign_tokens(page)
+    return page_to_lineitems(page)
+
+def test_matched_layout_reuses_grid_and_roles(cache_dir, balance_page):
+    first = balance_page()
+    items = _parse(first)
+    assert len(items) == 16
+    layouts.remember(first)
+
+    page = balance_page(tables=False)
+    tables = layouts.match(page)
+    assert tables is not None and tables[0].roles == first.tables[0].roles
+    page.tables = tables
+    assert _parse(page) == items
+
+def test_heuristic_change_takes_effect_on_known_layout(cache_dir, balance_page, monkeypatch):
+    first = balance_page()
+    _parse(first)
+    layouts.remember(first)
+
+    # a parser fix: only the latest year column is an amount column; shipped with a version bump
+    header_years = hf_table_to_rows._header_years
+    monkeypatch.setattr(hf_table_to_rows, "_header_years",
+                        lambda cells: header_years(cells).query("year == 2023"))
+    monkeypatch.setattr(pipeline, "PIPELINE_VERSION", "test-bump")
+
+    page = balance_page(tables=False)
+    assert layouts.match(page) is None  # roles of the old heuristics are not reused
+    page = balance_page()  # so the model runs
+    items = _parse(page)
+    assert {i.fiscal_year for i in items} == {2023}
+    layouts.remember(page)
+
+    again = balance_page(tables=False)
+    again.tables = layouts.match(again)
+    assert again.tables is not None
+    assert _parse(again) == items
+
+def test_page_cache_drops_layout_roles(cache_dir, balance_page):
+    page = balance_page()
+    _parse(page)
+    assert page.tables[0].roles is not None
+    cache.store_pages({"k": page})
+    assert cache.load_page("k", 3).tables[0].roles is None
+
+def test_invalid_entry_is_no_match(cache_dir, balance_page):
+    first = balance_page()
+    _parse(first)
+    layouts.remember(first)
+    page = balance_page(tables=False)
+    key = layouts._key(page, layouts._anchors(page))
+    entry = cache._read(layouts.KIND, key)
+    entry["tables"][0]["cells"][0].pop("row")  # e.g. an older entry format
+    cache._write(layouts.KIND, key, entry)
+
+    assert layouts.match(page) is None
+    assert cache._read(layouts.KIND, key) is None  # dropped, the model path stores a new one
+
+def test_grid_that_does_not_fit_is_no_match(cache_dir, balance_page, balance_rows):
+    first = balance_page()
+    _parse(first)
+    layouts.remember(first)
+    # same template words, but only one year filled in: too few of the stored cells are used
+    rows = balance_rows[:1] + [(acc, name, amount, "") for acc, name, amount, _ in balance_rows[1:]]
+    page = balance_page(rows, tables=False)
+    assert layouts._read(layouts.KIND, layouts._key(page, layouts._anchors(page))) is not None
+    assert layouts.match(page) is None
+
+def test_new_model_weights_are_no_match(cache_dir, balance_page, monkeypatch):
+    first = balance_page()
+    _parse(first)
+    layouts.remember(first)
+    monkeypatch.setattr(hf_table_transformer, "hf_revision", lambda repo_id: "new-weights")
+    assert layouts.match(balance_page(tables=False)) is None
@@ -0,0 +1,18 @@
+# tests/test_triage.py
+import fitz
+from app.pipeline.triage import triage_pages
+
+def _doc(*pages):
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for n, line in enumerate(lines):
+            page.insert_text((50, 60 + 16 * n), line, fontsize=10)
+    return doc
+
+def test_amounts_without_thousands_separators_keep_the_page():
+    # a detail page: no account numbers, amounts written 1234,56
+    table = [f"Kosten {1000 + 111 * n},56 {2000 + 37 * n},00" for n in range(8)]
+    legal = ["De raad van bestuur verklaart dat deze jaarrekening werd opgesteld"] * 4
+    with _doc(table, legal) as doc:
+        assert list(triage_pages(doc)) == [1]